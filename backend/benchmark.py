@@ -0,0 +1,276 @@
+"""
+Бенчмарки запросов API на рабочей БД
+Агрегаты считаются напрямую (мимо кэша ответов и снимков), на одном подключении из пула.
+
+Использование:
+    python benchmark.py prepared                  # текст запроса каждый раз vs PREPARE/EXECUTE
+    python benchmark.py prepared --iterations 200
+    python benchmark.py columnar --root data/columnar  # PostgreSQL vs колоночное зеркало (columnar_sync.py)
+    python benchmark.py dimensions                # размер и GROUP BY: текстовые столбцы vs ключи справочника
+"""
+import argparse
+import re
+import statistics
+import time
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+from psycopg2.extras import RealDictCursor
+
+import app as api
+import columnar
+
+# Эндпоинт → расчёт ответа на подключении conn
+DASHBOARD_WORKLOADS: Dict[str, Callable[[Any], Dict[str, Any]]] = {
+    "dashboard-data": lambda conn: api._compute_dashboard_data(conn, None),
+    "components-metrics": lambda conn: api._compute_components_metrics(conn, None, None, None, None),
+}
+
+
+def _run(conn, workload: Callable[[Any], Dict[str, Any]], iterations: int) -> List[float]:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        workload(conn)
+        timings.append((time.perf_counter() - started) * 1000)
+        conn.rollback()
+    return timings
+
+
+def _capture_calls(conn, workload: Callable[[Any], Dict[str, Any]]) -> Dict[str, Tuple[Sequence[Any], Dict[str, str]]]:
+    """Параметры и фрагменты первого вызова каждого запроса расчёта"""
+    calls: Dict[str, Tuple[Sequence[Any], Dict[str, str]]] = {}
+    execute = api.queries.execute
+
+    def recording(cursor, name: str, params: Sequence[Any] = (), **fragments: str) -> None:
+        calls.setdefault(name, (params, fragments))
+        execute(cursor, name, params, **fragments)
+
+    api.queries.execute = recording
+    try:
+        workload(conn)
+    finally:
+        del api.queries.execute
+        conn.rollback()
+    return calls
+
+
+def _planning_ms(conn, name: str, params: Sequence[Any], fragments: Dict[str, str]) -> float:
+    """Время планирования запроса с теми же фрагментами и параметрами (EXPLAIN SUMMARY без
+    выполнения) — то, что экономит EXECUTE"""
+    cursor = conn.cursor()
+    cursor.execute("EXPLAIN (SUMMARY ON) " + api.queries.sql(name, **fragments), params or None)
+    plan = "\n".join(row[0] for row in cursor.fetchall())
+    cursor.close()
+    conn.rollback()
+    match = re.search(r"Planning Time: ([\d.]+) ms", plan)
+    return float(match.group(1)) if match else 0.0
+
+
+def bench_prepared(iterations: int) -> None:
+    pool = api.get_db_pool()
+    conn = pool.getconn()
+    try:
+        print(f"{'workload':<22}{'mode':<10}{'mean, ms':>10}{'median, ms':>12}{'p95, ms':>10}")
+        per_query: Dict[bool, Dict[str, Dict[str, Any]]] = {}
+        calls: Dict[str, Tuple[Sequence[Any], Dict[str, str]]] = {}
+        for name, workload in DASHBOARD_WORKLOADS.items():
+            calls.update(_capture_calls(conn, workload))
+            results = {}
+            for prepared in (False, True):
+                api.queries.enabled = prepared
+                _run(conn, workload, 3)  # прогрев: PREPARE и кэш страниц
+                api.queries.reset_stats()
+                timings = _run(conn, workload, iterations)
+                per_query.setdefault(prepared, {}).update(
+                    {q: s for q, s in api.queries.stats().items() if s["calls"]}
+                )
+                results[prepared] = timings
+                p95 = sorted(timings)[max(0, int(len(timings) * 0.95) - 1)]
+                mode = "prepared" if prepared else "text"
+                print(f"{name:<22}{mode:<10}{statistics.mean(timings):>10.2f}{statistics.median(timings):>12.2f}{p95:>10.2f}")
+            saved = statistics.mean(results[False]) - statistics.mean(results[True])
+            print(f"{'':<22}{'saved':<10}{saved:>10.2f}  ({saved / statistics.mean(results[False]) * 100:.1f}%)")
+
+        print()
+        print(f"{'query':<44}{'text, ms':>10}{'prepared, ms':>14}{'planning, ms':>14}")
+        for query in per_query[True]:
+            planning = _planning_ms(conn, query, *calls[query])
+            print(f"{query:<44}{per_query[False][query]['mean_ms']:>10.3f}{per_query[True][query]['mean_ms']:>14.3f}{planning:>14.3f}")
+    finally:
+        api.queries.enabled = api.DB_PREPARED_STATEMENTS
+        pool.putconn(conn)
+
+
+def _components_workloads(conn) -> Dict[str, Callable[[Any], Any]]:
+    """Расчёты /api/components/*; фильтры — самый частый поставщик и последние три месяца данных"""
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    api.queries.execute(cursor, "suppliers_list", (1,))
+    supplier = cursor.fetchone()["supplier"]
+    cursor.execute("SELECT MAX(created_at)::date AS last_day FROM component")
+    date_to = cursor.fetchone()["last_day"]
+    cursor.close()
+    conn.rollback()
+    date_from = (date_to - timedelta(days=92)).replace(day=1)
+
+    def query(name: str, params: List[Any], **fragments: str) -> Callable[[Any], Any]:
+        def run(c) -> Any:
+            cur = c.cursor(cursor_factory=RealDictCursor)
+            api.queries.execute(cur, name, params, **fragments)
+            rows = cur.fetchall()
+            cur.close()
+            return rows
+        return run
+
+    return {
+        "components-metrics": lambda c: api._compute_components_metrics(c, None, None, None, None),
+        "metrics?supplier": lambda c: api._compute_components_metrics(c, None, None, supplier, None),
+        "metrics?date_from": lambda c: api._compute_components_metrics(c, None, None, None, None, date_from, date_to),
+        "components-pivot": query(
+            "components_pivot", [], row_expr="comp.supplier", col_expr="comp.object_type", value="COUNT(*)",
+            where="comp.supplier IS NOT NULL AND comp.supplier <> '' AND comp.object_type IS NOT NULL AND comp.object_type <> ''",
+        ),
+        "suppliers-list": query("suppliers_list", [1000]),
+        "companies-list": query("companies_list", [1000]),
+    }
+
+
+def bench_columnar(root: str, iterations: int) -> None:
+    reader = columnar.ColumnarReader(root, max_lag=float("inf"))
+    mirror = reader.connection()
+    if mirror is None:
+        raise SystemExit(f"Columnar mirror unavailable in {root}: run columnar_sync.py --once first")
+    pool = api.get_db_pool()
+    conn = pool.getconn()
+    try:
+        workloads = _components_workloads(conn)
+        print(f"Mirror {mirror.version}: {reader.stats()['rows']} rows")
+        print(f"{'workload':<22}{'postgresql, ms':>16}{'p95':>10}{'columnar, ms':>14}{'p95':>10}{'speedup':>10}")
+        for name, workload in workloads.items():
+            results = {}
+            for backend, c in (("postgresql", conn), ("columnar", mirror)):
+                _run(c, workload, 2)  # прогрев: кэш страниц и метаданные Parquet
+                timings = _run(c, workload, iterations)
+                results[backend] = (statistics.mean(timings), sorted(timings)[max(0, int(len(timings) * 0.95) - 1)])
+            (pg_mean, pg_p95), (col_mean, col_p95) = results["postgresql"], results["columnar"]
+            print(f"{name:<22}{pg_mean:>16.1f}{pg_p95:>10.1f}{col_mean:>14.1f}{col_p95:>10.1f}{pg_mean / col_mean:>9.1f}x")
+    finally:
+        pool.putconn(conn)
+
+
+# Разрезы /api/components/metrics, у которых есть вариант по ключам справочника (*_keyed)
+DIMENSION_QUERIES = (
+    "components_kpi",
+    "components_top_included_in",
+    "components_others_count",
+    "components_by_object_type",
+    "components_by_systems",
+    "components_top_suppliers",
+    "components_quantity_by_included_in",
+)
+
+DIMENSION_COLUMNS = ("supplier", "object_type", "included_in_name", "included_in_object_type")
+
+
+def _mb(size: float) -> str:
+    return f"{size / 1024 / 1024:.1f} MB"
+
+
+def bench_dimensions(iterations: int) -> None:
+    pool = api.get_db_pool()
+    conn = pool.getconn()
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        api.queries.execute(cursor, "component_dimensions_exists")
+        if not cursor.fetchone()["available"]:
+            raise SystemExit("Apply database/migration_component_dimensions.sql first")
+
+        # Размеры: таблица (все секции), справочник и средняя ширина столбцов измерений в строке
+        cursor.execute("""
+            SELECT SUM(pg_relation_size(relid)) AS heap, SUM(pg_indexes_size(relid)) AS indexes,
+                   SUM(c.reltuples) FILTER (WHERE c.reltuples > 0) AS rows
+            FROM pg_partition_tree('component') t JOIN pg_class c ON c.oid = t.relid
+            WHERE t.isleaf
+        """)
+        table = cursor.fetchone()
+        cursor.execute("""
+            SELECT pg_total_relation_size('component_dimension') AS size, COUNT(*) AS rows FROM component_dimension
+        """)
+        dimension = cursor.fetchone()
+        cursor.execute("SELECT {} FROM (SELECT * FROM component LIMIT 100000) s".format(", ".join(
+            f"AVG(pg_column_size({c})) AS {c}, AVG(pg_column_size({c}_id)) AS {c}_id" for c in DIMENSION_COLUMNS
+        )))
+        widths = cursor.fetchone()
+        cursor.close()
+        conn.rollback()
+        rows = float(table["rows"] or 0)
+        text_width = sum(float(widths[c] or 0) for c in DIMENSION_COLUMNS)
+        key_width = sum(float(widths[f"{c}_id"] or 0) for c in DIMENSION_COLUMNS)
+        print(f"component: {rows:.0f} rows, heap {_mb(table['heap'])}, indexes {_mb(table['indexes'])}")
+        print(f"component_dimension: {dimension['rows']} values, {_mb(dimension['size'])}")
+        print(f"{'column':<26}{'text, B/row':>12}{'key, B/row':>12}")
+        for c in DIMENSION_COLUMNS:
+            print(f"{c:<26}{float(widths[c] or 0):>12.1f}{float(widths[f'{c}_id'] or 0):>12.1f}")
+        print(f"{'total':<26}{text_width:>12.1f}{key_width:>12.1f}"
+              f"   (~{_mb(text_width * rows)} vs ~{_mb(key_width * rows)} per table)")
+        print()
+
+        # Фрагменты и параметры запросов — из расчёта метрик без фильтров в обоих вариантах
+        calls: Dict[str, Tuple[Sequence[Any], Dict[str, str]]] = {}
+        for keyed in (False, True):
+            api._dimensions_available = keyed
+            calls.update(_capture_calls(conn, lambda c: api._compute_components_metrics(c, None, None, None, None)))
+
+        def query(name: str) -> Callable[[Any], Any]:
+            params, fragments = calls[name]
+
+            def run(c) -> Any:
+                cur = c.cursor(cursor_factory=RealDictCursor)
+                api.queries.execute(cur, name, params, **fragments)
+                rows = cur.fetchall()
+                cur.close()
+                return rows
+            return run
+
+        def metrics(keyed: bool) -> Callable[[Any], Any]:
+            def run(c) -> Any:
+                api._dimensions_available = keyed
+                return api._compute_components_metrics(c, None, None, None, None)
+            return run
+
+        workloads = [(name, query(name), query(name + "_keyed")) for name in DIMENSION_QUERIES]
+        workloads.append(("components-metrics", metrics(False), metrics(True)))
+        print(f"{'workload':<38}{'text, ms':>12}{'keyed, ms':>12}{'speedup':>10}")
+        for name, text_workload, keyed_workload in workloads:
+            results = []
+            for workload in (text_workload, keyed_workload):
+                _run(conn, workload, 1)  # прогрев: кэш страниц
+                results.append(statistics.mean(_run(conn, workload, iterations)))
+            print(f"{name:<38}{results[0]:>12.1f}{results[1]:>12.1f}{results[0] / results[1]:>9.2f}x")
+    finally:
+        api._dimensions_available = None
+        pool.putconn(conn)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарки запросов API")
+    commands = parser.add_subparsers(dest="command", required=True)
+    prepared = commands.add_parser("prepared", help="Экономия на разборе и планировании: текст запроса vs PREPARE/EXECUTE")
+    prepared.add_argument("--iterations", type=int, default=100, help="Число расчётов на режим")
+    columnar_parser = commands.add_parser("columnar", help="Запросы /api/components/*: PostgreSQL vs колоночное зеркало")
+    columnar_parser.add_argument("--root", default=api.COLUMNAR_ROOT, help="Каталог зеркала (COLUMNAR_ROOT)")
+    columnar_parser.add_argument("--iterations", type=int, default=10, help="Число расчётов на режим")
+    dimensions_parser = commands.add_parser("dimensions", help="Столбцы измерений component: текст vs ключи справочника")
+    dimensions_parser.add_argument("--iterations", type=int, default=5, help="Число расчётов на режим")
+    args = parser.parse_args()
+
+    if args.command == "prepared":
+        bench_prepared(args.iterations)
+    elif args.command == "columnar":
+        bench_columnar(args.root, args.iterations)
+    elif args.command == "dimensions":
+        bench_dimensions(args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Колоночное зеркало таблицы component для аналитических запросов
+Синхронизатор (columnar_sync.py) выгружает component помесячно в Parquet-файлы в
+<root>/<версия>/ и атомарно заменяет <root>/manifest.json. Процесс API читает manifest
+и выполняет зарегистрированные запросы /api/components/* во встроенном DuckDB поверх этих
+файлов: векторные колоночные сканы вместо построчного GROUP BY в PostgreSQL.
+
+DuckDB — необязательная зависимость: без пакета duckdb зеркало просто недоступно.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+try:
+    import duckdb
+except ImportError:  # pragma: no cover - необязательная зависимость
+    duckdb = None
+
+from query_registry import to_numbered_params
+
+MANIFEST_NAME = "manifest.json"
+
+# Столбцы зеркала component (имя → тип DuckDB), в порядке выгрузки из PostgreSQL.
+# Только то, что читают запросы /api/components/*: updated_at есть не во всех базах
+# (database/migration_changes.sql), а синхронизатор берёт его из PostgreSQL, не из зеркала
+COMPONENT_COLUMNS = (
+    ("id", "INTEGER"),
+    ("name", "VARCHAR"),
+    ("object_type", "VARCHAR"),
+    ("included_in_name", "VARCHAR"),
+    ("included_in_object_type", "VARCHAR"),
+    ("supplier", "VARCHAR"),
+    ("quantity", "INTEGER"),
+    ("company_id", "INTEGER"),
+    ("created_at", "TIMESTAMP"),
+)
+
+# Из company запросам компонентов нужны только названия
+COMPANY_COLUMNS = (
+    ("id", "INTEGER"),
+    ("short_name", "VARCHAR"),
+)
+
+# manifest.json перечитывается не чаще раза в секунду
+_MANIFEST_CHECK_INTERVAL = 1.0
+
+
+def read_manifest(root: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(root, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _sql_list(paths: Sequence[str]) -> str:
+    return "[" + ", ".join("'" + p.replace("'", "''") + "'" for p in paths) + "]"
+
+
+def open_database(root: str, manifest: Dict[str, Any], threads: Optional[int] = None):
+    """In-memory DuckDB с представлениями component и company поверх файлов версии из manifest"""
+    files = manifest["files"]
+    db = duckdb.connect(":memory:", config={"threads": threads} if threads else {})
+    # Метаданные Parquet (статистики row group) кэшируются между запросами
+    db.execute("SET enable_object_cache = true")
+    if files["component"]:
+        db.execute("CREATE VIEW component AS SELECT * FROM read_parquet({})".format(
+            _sql_list([os.path.join(root, p) for p in files["component"]])
+        ))
+    else:
+        # В component нет строк — пустая таблица с той же схемой
+        db.execute("CREATE TABLE component ({})".format(", ".join(f"{n} {t}" for n, t in COMPONENT_COLUMNS)))
+    db.execute("CREATE VIEW company AS SELECT * FROM read_parquet({})".format(
+        _sql_list([os.path.join(root, files["company"])])
+    ))
+    return db
+
+
+class ColumnarCursor:
+    """Курсор DuckDB с интерфейсом курсора psycopg2, достаточным для QueryRegistry.execute.
+
+    Параметры %s переводятся в $n; строки — словари (cursor_factory=RealDictCursor) или кортежи.
+    """
+
+    def __init__(self, connection: "ColumnarConnection", as_dict: bool):
+        self.connection = connection
+        self._cursor = connection.db.cursor()
+        self._as_dict = as_dict
+        self._rows: List[Any] = []
+        self._pos = 0
+        self.rowcount = -1
+
+    def execute(self, sql: str, params: Optional[Sequence[Any]] = None) -> None:
+        numbered_sql, _ = to_numbered_params(sql)
+        try:
+            self._cursor.execute(numbered_sql, list(params) if params else None)
+            rows = self._cursor.fetchall()
+        except Exception as e:
+            self.connection.reader.mark_failed(self.connection.version, e)
+            raise
+        if self._as_dict:
+            names = [d[0] for d in self._cursor.description]
+            rows = [dict(zip(names, row)) for row in rows]
+        self._rows = rows
+        self._pos = 0
+        self.rowcount = len(rows)
+
+    def fetchone(self) -> Any:
+        if self._pos >= len(self._rows):
+            return None
+        row = self._rows[self._pos]
+        self._pos += 1
+        return row
+
+    def fetchall(self) -> List[Any]:
+        rows = self._rows[self._pos:]
+        self._pos = len(self._rows)
+        return rows
+
+    def close(self) -> None:
+        self._cursor.close()
+
+
+class ColumnarConnection:
+    """Подключение к зеркалу на время одного запроса API.
+
+    data_version — версия данных PostgreSQL, с которой согласовано зеркало (для кэша ответов).
+    """
+
+    columnar = True
+
+    def __init__(self, reader: "ColumnarReader", db: Any, version: str, data_version: Optional[str]):
+        self.reader = reader
+        self.db = db
+        self.version = version
+        self.data_version = data_version
+
+    def cursor(self, cursor_factory: Any = None) -> ColumnarCursor:
+        return ColumnarCursor(self, as_dict=cursor_factory is not None)
+
+    def rollback(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class ColumnarReader:
+    """Текущая версия зеркала для процесса API.
+
+    connection() возвращает None, если зеркала нет, синхронизатор давно не отмечался
+    (checked_at старше max_lag секунд) или запросы к этой версии файлов завершились ошибкой —
+    тогда запросы выполняются в PostgreSQL.
+    """
+
+    def __init__(self, root: str, max_lag: float = 120.0, threads: Optional[int] = None):
+        self.root = root
+        self.max_lag = max_lag
+        self.threads = threads
+        self._lock = threading.Lock()
+        self._manifest: Dict[str, Any] = {}
+        self._manifest_checked = 0.0
+        self._db: Any = None
+        self._version: Optional[str] = None
+        self._failed_version: Optional[str] = None
+        self._last_error: Optional[str] = None
+        self._served = 0
+        self._fallbacks: Dict[str, int] = {"unavailable": 0, "stale": 0, "failed": 0}
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if now - self._manifest_checked < _MANIFEST_CHECK_INTERVAL:
+            return
+        self._manifest_checked = now
+        manifest = read_manifest(self.root)
+        self._manifest = manifest
+        version = manifest.get("version")
+        if version == self._version or version is None or version == self._failed_version:
+            return
+        try:
+            db = open_database(self.root, manifest, self.threads)
+        except Exception as e:
+            self._failed_version = version
+            self._last_error = str(e)
+            print(f"Columnar mirror error: {e}")
+            return
+        self._db, self._version = db, version
+
+    def connection(self) -> Optional[ColumnarConnection]:
+        if duckdb is None:
+            return None
+        with self._lock:
+            self._refresh()
+            manifest = self._manifest
+            if self._db is None or manifest.get("version") != self._version:
+                reason = "failed" if self._failed_version and self._failed_version == manifest.get("version") else "unavailable"
+            elif time.time() - float(manifest.get("checked_at_ts", 0)) > self.max_lag:
+                reason = "stale"
+            else:
+                self._served += 1
+                return ColumnarConnection(self, self._db, self._version, manifest.get("data_version"))
+            self._fallbacks[reason] += 1
+            return None
+
+    def mark_failed(self, version: str, error: Exception) -> None:
+        """Ошибка запроса к версии зеркала: до следующей версии запросы идут в PostgreSQL"""
+        with self._lock:
+            self._last_error = str(error)
+            if version == self._version:
+                self._failed_version = version
+                self._db, self._version = None, None
+        print(f"Columnar mirror error: {error}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            manifest = self._manifest
+            return {
+                "available": duckdb is not None,
+                "root": self.root,
+                "version": self._version,
+                "data_version": manifest.get("data_version"),
+                "rows": manifest.get("rows"),
+                "synced_at": manifest.get("synced_at"),
+                "checked_at": manifest.get("checked_at"),
+                "served": self._served,
+                "fallbacks": dict(self._fallbacks),
+                "last_error": self._last_error,
+            }
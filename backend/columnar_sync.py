@@ -0,0 +1,355 @@
+"""
+Синхронизация колоночного зеркала component (см. columnar.py)
+component выгружается помесячно (по created_at) в Parquet-файлы <root>/<версия>/component_YYYY_MM.parquet,
+названия компаний — в company.parquet. Новая версия собирается во временном каталоге:
+перевыгружаются только месяцы, где после прошлой синхронизации появились, изменились или
+были удалены строки, остальные файлы переносятся жёсткими ссылками. Затем атомарно
+заменяется <root>/manifest.json — процессы API переключаются на новую версию.
+
+Изменённые месяцы находятся по ленте изменений (database/migration_changes.sql): строки с
+updated_at не раньше курсора и надгробия удалённых строк; старый месяц изменённых и удалённых
+строк (с id не больше уже выгруженного) берётся из текущей версии зеркала. Без ленты, после
+TRUNCATE или очистки надгробий старше курсора выполняется полная перевыгрузка.
+
+Использование:
+    python columnar_sync.py --root /var/lib/vsm400/columnar            # синхронизировать по мере изменений
+    python columnar_sync.py --root /var/lib/vsm400/columnar --once     # синхронизировать один раз
+    python columnar_sync.py --root /var/lib/vsm400/columnar --full     # полная перевыгрузка
+    python columnar_sync.py --root /var/lib/vsm400/columnar --check    # сверка зеркала с PostgreSQL
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from psycopg2.extras import RealDictCursor
+
+import app as api
+import columnar
+from publisher import cleanup, write_atomic
+
+# Выгрузка одного месяца: {where} — условие на created_at
+COMPONENT_EXPORT_SQL = "COPY (SELECT {columns} FROM component WHERE {where}) TO STDOUT WITH (FORMAT csv)"
+COMPANY_EXPORT_SQL = "COPY (SELECT {columns} FROM company) TO STDOUT WITH (FORMAT csv)"
+
+# Изменённых строк больше этого — дешевле перевыгрузить всё, чем искать их старые месяцы
+COLUMNAR_SYNC_MAX_CHANGED_IDS = int(os.getenv("COLUMNAR_SYNC_MAX_CHANGED_IDS", "200000"))
+
+UNDATED = "undated"
+
+api.queries.register("columnar_changes_available", """
+    SELECT to_regclass('public.change_tombstone') IS NOT NULL
+       AND EXISTS (SELECT 1 FROM information_schema.columns
+                   WHERE table_name = 'component' AND column_name = 'updated_at') AS available
+""")
+api.queries.register("columnar_months", "SELECT DISTINCT DATE_TRUNC('month', created_at) AS month FROM component")
+api.queries.register("columnar_max_id", "SELECT MAX(id) AS max_id FROM component")
+api.queries.register("columnar_changed_months", """
+    SELECT DISTINCT DATE_TRUNC('month', created_at) AS month FROM component WHERE updated_at >= %s
+""")
+api.queries.register("columnar_changed_ids", "SELECT id FROM component WHERE updated_at >= %s AND id <= %s")
+api.queries.register("columnar_deleted", """
+    SELECT row_id, op FROM change_tombstone WHERE table_name = 'component' AND deleted_at >= %s
+""")
+
+# Сверка: один и тот же текст выполняется в PostgreSQL и в зеркале
+api.queries.register("columnar_check_months", """
+    SELECT DATE_TRUNC('month', created_at) AS month,
+           COUNT(*) AS count,
+           COALESCE(SUM(quantity), 0) AS quantity,
+           COALESCE(SUM(id::bigint), 0) AS id_sum
+    FROM component
+    GROUP BY 1
+""")
+api.queries.register("columnar_check_company", """
+    SELECT COUNT(*) AS count, COALESCE(SUM(id::bigint), 0) AS id_sum FROM company
+""")
+
+
+def month_key(month: Optional[datetime]) -> str:
+    return month.strftime("%Y_%m") if month is not None else UNDATED
+
+
+def _month_where(key: str) -> str:
+    if key == UNDATED:
+        return "created_at IS NULL"
+    year, month = (int(part) for part in key.split("_"))
+    start = datetime(year, month, 1)
+    end = datetime(year + month // 12, month % 12 + 1, 1)
+    return f"created_at >= '{start.isoformat()}' AND created_at < '{end.isoformat()}'"
+
+
+def _table_versions(data_version: Optional[str]) -> Dict[str, str]:
+    """'company:5,component:8' → {'company': '5', 'component': '8'}"""
+    if not data_version:
+        return {}
+    return dict(part.split(":", 1) for part in data_version.split(","))
+
+
+def _column_names() -> List[str]:
+    return [name for name, _ in columnar.COMPONENT_COLUMNS]
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _export(conn, duck, copy_sql: str, columns, csv_path: str, parquet_path: str, order_by: str) -> int:
+    """Выгрузить результат COPY из PostgreSQL в Parquet через CSV; возвращает число строк"""
+    cursor = conn.cursor()
+    with open(csv_path, "w", encoding="utf-8", newline="") as f:
+        cursor.copy_expert(copy_sql, f)
+    cursor.close()
+    types = ", ".join(f"'{name}': '{sql_type}'" for name, sql_type in columns)
+    # Пути в COPY не параметризуются
+    rows = duck.execute(
+        f"COPY (SELECT * FROM read_csv({_quote(csv_path)}, columns = {{{types}}}, header = false, auto_detect = false, "
+        f"allow_quoted_nulls = false) ORDER BY {order_by}) TO {_quote(parquet_path)} (FORMAT parquet, COMPRESSION zstd)"
+    ).fetchone()[0]
+    os.remove(csv_path)
+    return int(rows)
+
+
+def _link_forward(src: str, dst: str) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _old_months(root: str, manifest: Dict[str, Any], ids: List[int]) -> Set[str]:
+    """Месяцы, в которых строки с этими id лежат в текущей версии зеркала"""
+    if not ids:
+        return set()
+    duck = columnar.open_database(root, manifest)
+    try:
+        rows = duck.execute(
+            "SELECT DISTINCT DATE_TRUNC('month', created_at) FROM component WHERE id IN (SELECT UNNEST(?::INTEGER[]))",
+            [ids],
+        ).fetchall()
+    finally:
+        duck.close()
+    return {month_key(row[0]) for row in rows}
+
+
+def _heartbeat(root: str, manifest: Dict[str, Any], **updates: Any) -> Dict[str, Any]:
+    """Переписать manifest без новой версии файлов: зеркало проверено и актуально"""
+    now = datetime.now()
+    manifest = {**manifest, **updates, "checked_at": now.strftime("%Y-%m-%d %H:%M:%S.%f"), "checked_at_ts": now.timestamp()}
+    write_atomic(os.path.join(root, columnar.MANIFEST_NAME), json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"))
+    return manifest
+
+
+def sync(root: str, keep: int = 3, full: bool = False) -> Optional[Dict[str, Any]]:
+    """Синхронизировать зеркало; возвращает manifest новой версии или None, если файлы не менялись"""
+    os.makedirs(root, exist_ok=True)
+    manifest = columnar.read_manifest(root)
+    if not manifest.get("version") or not os.path.isdir(os.path.join(root, manifest["version"])):
+        manifest, full = {}, True
+    # Файлы другого набора столбцов нельзя читать вместе с новыми — перевыгружается всё
+    if manifest.get("columns") != _column_names():
+        full = True
+
+    with api.db_connection() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        # Все чтения — из одного снимка: версия данных, лента изменений и выгруженные месяцы согласованы
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        data_version = api.get_data_version(conn)
+        if not full and data_version is not None and manifest.get("data_version") == data_version:
+            _heartbeat(root, manifest)
+            return None
+
+        api.queries.execute(cursor, "columnar_changes_available")
+        changes_available = bool(cursor.fetchone()["available"])
+        next_cursor = None
+        if changes_available:
+            # Курсор следующей синхронизации — не позже начала незавершённых пишущих транзакций
+            api.queries.execute(cursor, "changes_watermark", (0,))
+            watermark = cursor.fetchone()
+            next_cursor = watermark["watermark"]
+            since = datetime.fromisoformat(manifest["cursor"]) if manifest.get("cursor") else None
+            if watermark["hidden_writers"]:
+                # Начало чужой пишущей транзакции не видно (нет pg_read_all_stats) — курсор остаётся прежним
+                next_cursor = since
+            purged_before = watermark["purged_before"]
+            if since is None or (purged_before is not None and since < purged_before):
+                full = True
+        else:
+            full = True
+
+        months: Set[str] = set()
+        if not full:
+            api.queries.execute(cursor, "columnar_deleted", (since,))
+            deleted = cursor.fetchall()
+            if any(r["op"] == "truncate" for r in deleted):
+                full = True
+            else:
+                api.queries.execute(cursor, "columnar_changed_months", (since,))
+                months = {month_key(r["month"]) for r in cursor.fetchall()}
+                api.queries.execute(cursor, "columnar_changed_ids", (since, manifest.get("max_id") or 0))
+                ids = [r["id"] for r in cursor.fetchall()] + [r["row_id"] for r in deleted]
+                if len(ids) > COLUMNAR_SYNC_MAX_CHANGED_IDS:
+                    full = True
+                else:
+                    months |= _old_months(root, manifest, ids)
+        if full:
+            api.queries.execute(cursor, "columnar_months")
+            months = {month_key(r["month"]) for r in cursor.fetchall()}
+
+        api.queries.execute(cursor, "columnar_max_id")
+        max_id = cursor.fetchone()["max_id"]
+        company_changed = full or data_version is None or (
+            _table_versions(data_version).get("company") != _table_versions(manifest.get("data_version")).get("company")
+        )
+        cursor_value = next_cursor.isoformat() if next_cursor is not None else None
+        if not months and not company_changed:
+            _heartbeat(root, manifest, data_version=data_version, cursor=cursor_value, max_id=max_id)
+            return None
+
+        version = datetime.now().strftime("%Y%m%d%H%M%S%f")
+        tmp_dir = os.path.join(root, f".tmp-{version}-{os.getpid()}")
+        os.makedirs(tmp_dir)
+        duck = columnar.duckdb.connect(":memory:")
+        try:
+            month_rows: Dict[str, int] = {} if full else dict(manifest.get("months", {}))
+            component_columns = ", ".join(_column_names())
+            for key in sorted(months):
+                rows = _export(
+                    conn, duck, COMPONENT_EXPORT_SQL.format(columns=component_columns, where=_month_where(key)),
+                    columnar.COMPONENT_COLUMNS, os.path.join(tmp_dir, f"component_{key}.csv"),
+                    os.path.join(tmp_dir, f"component_{key}.parquet"), order_by="created_at, id",
+                )
+                if rows:
+                    month_rows[key] = rows
+                else:
+                    os.remove(os.path.join(tmp_dir, f"component_{key}.parquet"))
+                    month_rows.pop(key, None)
+            # Остальные месяцы не менялись — переносим файлы прошлой версии
+            for key in month_rows:
+                if key not in months:
+                    name = f"component_{key}.parquet"
+                    _link_forward(os.path.join(root, manifest["version"], name), os.path.join(tmp_dir, name))
+
+            if company_changed:
+                _export(
+                    conn, duck, COMPANY_EXPORT_SQL.format(columns=", ".join(name for name, _ in columnar.COMPANY_COLUMNS)),
+                    columnar.COMPANY_COLUMNS, os.path.join(tmp_dir, "company.csv"),
+                    os.path.join(tmp_dir, "company.parquet"), order_by="id",
+                )
+            else:
+                _link_forward(os.path.join(root, manifest["files"]["company"]), os.path.join(tmp_dir, "company.parquet"))
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        finally:
+            duck.close()
+        os.rename(tmp_dir, os.path.join(root, version))
+
+    now = datetime.now()
+    manifest = {
+        "version": version,
+        "data_version": data_version,
+        "synced_at": now.strftime("%Y-%m-%d %H:%M:%S.%f"),
+        "checked_at": now.strftime("%Y-%m-%d %H:%M:%S.%f"),
+        "checked_at_ts": now.timestamp(),
+        "full": full,
+        "rewritten_months": sorted(months),
+        "cursor": cursor_value,
+        "max_id": max_id,
+        "columns": _column_names(),
+        "rows": sum(month_rows.values()),
+        "months": dict(sorted(month_rows.items())),
+        "files": {
+            "component": [f"{version}/component_{key}.parquet" for key in sorted(month_rows)],
+            "company": f"{version}/company.parquet",
+        },
+    }
+    write_atomic(os.path.join(root, columnar.MANIFEST_NAME), json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"))
+    cleanup(root, current=version, keep=keep)
+    return manifest
+
+
+def check(root: str) -> bool:
+    """Сверить зеркало с PostgreSQL по месяцам: число строк, сумма quantity, сумма id"""
+    reader = columnar.ColumnarReader(root, max_lag=float("inf"))
+    mirror = reader.connection()
+    if mirror is None:
+        print(f"Columnar mirror unavailable in {root}: {reader.stats()['last_error'] or 'no manifest'}")
+        return False
+
+    def collect(conn) -> Dict[str, Any]:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        api.queries.execute(cursor, "columnar_check_months")
+        months = {month_key(r["month"]): (int(r["count"]), int(r["quantity"]), int(r["id_sum"])) for r in cursor.fetchall()}
+        api.queries.execute(cursor, "columnar_check_company")
+        company = cursor.fetchone()
+        cursor.close()
+        return {"months": months, "company": (int(company["count"]), int(company["id_sum"]))}
+
+    with api.db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        cursor.close()
+        data_version = api.get_data_version(conn)
+        expected = collect(conn)
+    actual = collect(mirror)
+
+    mismatches = 0
+    for key in sorted(set(expected["months"]) | set(actual["months"])):
+        pg, mirrored = expected["months"].get(key), actual["months"].get(key)
+        if pg != mirrored:
+            mismatches += 1
+            print(f"component {key}: postgresql (count, quantity, id_sum)={pg}, columnar={mirrored}")
+    if expected["company"] != actual["company"]:
+        mismatches += 1
+        print(f"company: postgresql (count, id_sum)={expected['company']}, columnar={actual['company']}")
+
+    total = sum(v[0] for v in expected["months"].values())
+    print(f"Checked {len(expected['months'])} months, {total} rows: {mismatches} mismatches "
+          f"(version {mirror.version}, data_version {mirror.data_version})")
+    if mismatches and data_version != mirror.data_version:
+        print(f"PostgreSQL data_version is {data_version}: mismatches may be changes not yet synced")
+    return mismatches == 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Синхронизация колоночного зеркала component")
+    parser.add_argument("--root", default=api.COLUMNAR_ROOT, help="Каталог зеркала (как COLUMNAR_ROOT у API)")
+    parser.add_argument("--interval", type=float, default=float(os.getenv("COLUMNAR_SYNC_INTERVAL", "30")), help="Период синхронизации, с")
+    parser.add_argument("--keep", type=int, default=int(os.getenv("COLUMNAR_KEEP_VERSIONS", "3")), help="Сколько версий хранить")
+    parser.add_argument("--once", action="store_true", help="Синхронизировать один раз и выйти")
+    parser.add_argument("--full", action="store_true", help="Перевыгрузить все месяцы (один раз и выйти)")
+    parser.add_argument("--check", action="store_true", help="Сверить зеркало с PostgreSQL и выйти")
+    args = parser.parse_args()
+    if columnar.duckdb is None:
+        parser.error("нужен пакет duckdb: pip install -r requirements-analytics.txt")
+
+    if args.check:
+        sys.exit(0 if check(args.root) else 1)
+
+    while True:
+        started = time.perf_counter()
+        try:
+            manifest = sync(args.root, keep=args.keep, full=args.full)
+            if manifest is not None:
+                if manifest["full"]:
+                    rewritten = "full"
+                elif manifest["rewritten_months"]:
+                    rewritten = "months " + ", ".join(manifest["rewritten_months"])
+                else:
+                    rewritten = "company only"
+                print(f"Synced {manifest['version']}: {manifest['rows']} rows, {rewritten} "
+                      f"in {time.perf_counter() - started:.1f}s (data_version={manifest['data_version']})")
+        except Exception as e:
+            print(f"Columnar sync error: {e}")
+        if args.once or args.full:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
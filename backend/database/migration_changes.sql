@@ -0,0 +1,114 @@
+-- Лента изменений для инкрементальной синхронизации (/api/changes)
+-- Вставленные и изменённые строки company и component читаются по индексу (updated_at, id),
+-- удалённые — из таблицы надгробий change_tombstone, которую заполняют триггеры.
+--
+-- Применение (после database/schema_companies.sql):
+--   psql -d tnb_user_1_vsm400 -f database/migration_changes.sql
+-- Очистка старых надгробий (ежедневно по cron; курсоры старше срока получат 410 и должны
+-- выполнить полную синхронизацию):
+--   psql -d tnb_user_1_vsm400 -c "SELECT change_tombstone_purge(INTERVAL '30 days')"
+
+-- component.updated_at: значение по умолчанию для существующих строк — время миграции
+ALTER TABLE component ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+-- Функция из database/schema_companies.sql: в базах, созданных раньше, она меняла updated_at
+-- при любом UPDATE, в том числе при пересчёте служебных столбцов
+CREATE OR REPLACE FUNCTION update_updated_at_column()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Пересчёт только служебных производных столбцов (поисковый вектор, балл риска, ключи
+    -- справочников component) не меняет updated_at: строка не попадает в ленту /api/changes,
+    -- и пакетный пересчёт не требует отключать триггер
+    IF to_jsonb(NEW) - ARRAY['updated_at', 'search_tsv', 'risk_score', 'supplier_id', 'object_type_id',
+                             'included_in_name_id', 'included_in_object_type_id']
+       IS NOT DISTINCT FROM
+       to_jsonb(OLD) - ARRAY['updated_at', 'search_tsv', 'risk_score', 'supplier_id', 'object_type_id',
+                             'included_in_name_id', 'included_in_object_type_id'] THEN
+        RETURN NEW;
+    END IF;
+    NEW.updated_at = CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS update_component_updated_at ON component;
+CREATE TRIGGER update_component_updated_at
+    BEFORE UPDATE ON component
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+-- Порядок ленты — (updated_at, id): постраничное чтение по курсору без сортировки всей таблицы
+CREATE INDEX IF NOT EXISTS idx_company_updated_at_id ON company (updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_component_updated_at_id ON component (updated_at, id);
+
+-- Надгробия удалённых строк; op = 'truncate' (row_id = 0) — таблица очищена целиком
+CREATE TABLE IF NOT EXISTS change_tombstone (
+    table_name VARCHAR(100) NOT NULL,
+    row_id BIGINT NOT NULL,
+    op VARCHAR(10) NOT NULL DEFAULT 'delete' CHECK (op IN ('delete', 'truncate')),
+    deleted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_change_tombstone_order ON change_tombstone (table_name, deleted_at, row_id);
+
+-- Надгробия старше purged_before удалены: курсоры до этого момента недействительны
+CREATE TABLE IF NOT EXISTS change_tombstone_state (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    purged_before TIMESTAMP
+);
+
+INSERT INTO change_tombstone_state (id) VALUES (TRUE) ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION record_change_tombstone()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        INSERT INTO change_tombstone (table_name, row_id, op) VALUES (TG_TABLE_NAME, 0, 'truncate');
+    ELSE
+        INSERT INTO change_tombstone (table_name, row_id) SELECT TG_TABLE_NAME, id FROM old_rows;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS company_change_tombstone ON company;
+CREATE TRIGGER company_change_tombstone
+    AFTER DELETE ON company
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION record_change_tombstone();
+
+DROP TRIGGER IF EXISTS company_change_truncate ON company;
+CREATE TRIGGER company_change_truncate
+    AFTER TRUNCATE ON company
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION record_change_tombstone();
+
+DROP TRIGGER IF EXISTS component_change_tombstone ON component;
+CREATE TRIGGER component_change_tombstone
+    AFTER DELETE ON component
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION record_change_tombstone();
+
+DROP TRIGGER IF EXISTS component_change_truncate ON component;
+CREATE TRIGGER component_change_truncate
+    AFTER TRUNCATE ON component
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION record_change_tombstone();
+
+-- Удалить надгробия старше p_keep; возвращает число удалённых
+CREATE OR REPLACE FUNCTION change_tombstone_purge(p_keep INTERVAL)
+RETURNS INTEGER AS $$
+DECLARE
+    v_before TIMESTAMP := LOCALTIMESTAMP - p_keep;
+    v_deleted INTEGER;
+BEGIN
+    DELETE FROM change_tombstone WHERE deleted_at < v_before;
+    GET DIAGNOSTICS v_deleted = ROW_COUNT;
+    UPDATE change_tombstone_state SET purged_before = GREATEST(COALESCE(purged_before, v_before), v_before);
+    RETURN v_deleted;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON TABLE change_tombstone IS 'Удалённые строки company и component для ленты изменений /api/changes';
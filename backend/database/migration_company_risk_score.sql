@@ -0,0 +1,79 @@
+-- Сводный балл риска компании для /api/companies/ranking
+-- company.risk_score (0–100, больше — рискованнее) сводит ИДО, ИФР, ИПД и оценку СПАРК:
+--   ido × 0.3 + ifr × 0.3 + (100 − ipd) × 0.2 + уровень spark_risk × 0.2,
+-- уровень spark_risk: Низкий 0, Средний 33.33, Высокий 66.67, Критический 100.
+-- Не указанные показатели (NULL, неизвестное значение spark_risk) не учитываются, веса остальных
+-- нормируются; без единого показателя балл NULL и компания в рейтинг не попадает.
+-- Балл считает триггер в той же команде, которая вставляет или меняет строку (отдельной записи
+-- строки нет); рейтинг читается по индексу (risk_score, id) без сортировки таблицы.
+--
+-- Применение (после database/schema_companies.sql):
+--   psql -d tnb_user_1_vsm400 -f database/migration_company_risk_score.sql
+-- После изменения формулы (CREATE OR REPLACE FUNCTION company_risk_score) баллы всех компаний
+-- пересчитываются пакетами:
+--   python risk_score.py
+-- При массовой загрузке триггер балла можно отключить и пересчитать баллы после загрузки:
+--   ALTER TABLE company DISABLE TRIGGER company_risk_score;
+--   ... COPY / INSERT ...
+--   ALTER TABLE company ENABLE TRIGGER company_risk_score;
+--   python risk_score.py
+
+ALTER TABLE company ADD COLUMN IF NOT EXISTS risk_score NUMERIC(5,2);
+
+-- Уровень оценки СПАРК в шкале 0–100 (NULL для пустого и неизвестного значения)
+CREATE OR REPLACE FUNCTION company_spark_risk_level(p_spark_risk TEXT)
+RETURNS NUMERIC AS $$
+    SELECT CASE p_spark_risk
+        WHEN 'Низкий' THEN 0
+        WHEN 'Средний' THEN 100 / 3.0
+        WHEN 'Высокий' THEN 200 / 3.0
+        WHEN 'Критический' THEN 100
+    END
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Одно выражение без подзапросов: PostgreSQL встраивает функцию в запрос, и пакетный
+-- UPDATE считает балл для всех строк пакета без вызова функции на каждую строку
+CREATE OR REPLACE FUNCTION company_risk_score(p_ido NUMERIC, p_ifr NUMERIC, p_ipd NUMERIC, p_spark_risk TEXT)
+RETURNS NUMERIC AS $$
+    SELECT ROUND(
+        (COALESCE(0.3 * p_ido, 0) + COALESCE(0.3 * p_ifr, 0) + COALESCE(0.2 * (100 - p_ipd), 0)
+         + COALESCE(0.2 * company_spark_risk_level(p_spark_risk), 0))
+        / NULLIF(
+            CASE WHEN p_ido IS NULL THEN 0 ELSE 0.3 END
+            + CASE WHEN p_ifr IS NULL THEN 0 ELSE 0.3 END
+            + CASE WHEN p_ipd IS NULL THEN 0 ELSE 0.2 END
+            + CASE WHEN company_spark_risk_level(p_spark_risk) IS NULL THEN 0 ELSE 0.2 END,
+            0
+        ),
+        2
+    )
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION company_risk_score_update()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.risk_score := company_risk_score(NEW.ido, NEW.ifr, NEW.ipd, NEW.spark_risk);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS company_risk_score ON company;
+CREATE TRIGGER company_risk_score
+    BEFORE INSERT OR UPDATE OF ido, ifr, ipd, spark_risk ON company
+    FOR EACH ROW
+    EXECUTE FUNCTION company_risk_score_update();
+
+-- Заполнение существующих строк; меняется только risk_score, поэтому update_updated_at_column
+-- (database/migration_changes.sql) не трогает updated_at и строки не попадают в /api/changes
+UPDATE company SET risk_score = company_risk_score(ido, ifr, ipd, spark_risk)
+WHERE risk_score IS DISTINCT FROM company_risk_score(ido, ifr, ipd, spark_risk);
+
+-- Рейтинг: обратный проход по индексу от наибольшего балла, с фильтром — по индексу
+-- с регионом или оценкой СПАРК впереди
+CREATE INDEX IF NOT EXISTS idx_company_risk_score ON company (risk_score, id) WHERE risk_score IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_company_region_risk_score ON company (region, risk_score, id) WHERE risk_score IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_company_spark_risk_score ON company (spark_risk, risk_score, id) WHERE risk_score IS NOT NULL;
+
+ANALYZE company;
+
+COMMENT ON COLUMN company.risk_score IS 'Сводный балл риска 0–100 по ido/ifr/ipd/spark_risk (триггер company_risk_score, пересчёт — risk_score.py)';
@@ -0,0 +1,37 @@
+-- Полнотекстовый поиск компаний для /api/companies/search
+-- company.search_tsv — tsvector по short_name (вес A), full_name (B) и address (C) с русской
+-- морфологией; поддерживается триггером при вставке и изменении этих полей, индексируется GIN.
+-- Поиск по началу ИНН идёт по индексу inn с побайтовым порядком (COLLATE "C").
+--
+-- Применение (после database/schema_companies.sql):
+--   psql -d tnb_user_1_vsm400 -f database/migration_company_search.sql
+
+ALTER TABLE company ADD COLUMN IF NOT EXISTS search_tsv tsvector;
+
+CREATE OR REPLACE FUNCTION company_search_tsv_update()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.search_tsv :=
+        setweight(to_tsvector('russian', COALESCE(NEW.short_name, '')), 'A') ||
+        setweight(to_tsvector('russian', COALESCE(NEW.full_name, '')), 'B') ||
+        setweight(to_tsvector('russian', COALESCE(NEW.address, '')), 'C');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS company_search_tsv ON company;
+CREATE TRIGGER company_search_tsv
+    BEFORE INSERT OR UPDATE OF short_name, full_name, address ON company
+    FOR EACH ROW
+    EXECUTE FUNCTION company_search_tsv_update();
+
+-- Заполнение существующих строк; меняется только search_tsv, поэтому update_updated_at_column
+-- (database/migration_changes.sql) не трогает updated_at и строки не попадают в /api/changes
+UPDATE company SET short_name = short_name WHERE search_tsv IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_company_search_tsv ON company USING gin (search_tsv);
+CREATE INDEX IF NOT EXISTS idx_company_inn_prefix ON company (inn COLLATE "C");
+
+ANALYZE company;
+
+COMMENT ON COLUMN company.search_tsv IS 'Поисковый вектор short_name/full_name/address (триггер company_search_tsv)';
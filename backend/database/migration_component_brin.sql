@@ -0,0 +1,19 @@
+-- BRIN-индекс по created_at для установок без секционирования component
+-- (вместо database/migration_component_partitioning.sql).
+-- Строки component добавляются в порядке created_at, поэтому соседние страницы таблицы
+-- содержат близкие даты: BRIN хранит min/max created_at на каждые 32 страницы и позволяет
+-- запросам за период (динамика по месяцам, метрики с date_from/date_to) пропускать остальные
+-- страницы. Индекс занимает килобайты и почти не замедляет вставку.
+--
+-- Применение:
+--   psql -d tnb_user_1_vsm400 -f database/migration_component_brin.sql
+-- Если строки вставлялись не по порядку дат (массовая загрузка старых данных), эффективность
+-- индекса видна по корреляции:
+--   SELECT correlation FROM pg_stats WHERE tablename = 'component' AND attname = 'created_at';
+-- При корреляции заметно ниже 0.9 таблицу стоит один раз упорядочить:
+--   CLUSTER component USING <btree-индекс по created_at>;
+
+CREATE INDEX IF NOT EXISTS idx_component_created_at_brin
+    ON component USING brin (created_at) WITH (pages_per_range = 32);
+
+ANALYZE component;
@@ -0,0 +1,143 @@
+-- Дневной rollup component для /api/components/timeline
+-- Счётчики по дням в разрезе фильтров API (included_in_name, supplier, company_id) за закрытые
+-- дни; недели, месяцы и кварталы складываются из дней. По сырым строкам считается только хвост
+-- начиная с component_daily_stats_horizon() — обычно сегодняшний день. Изменение строк прошлых
+-- дней помечает день, и он считается по сырым строкам до следующего обновления rollup.
+--
+-- Применение:
+--   psql -d tnb_user_1_vsm400 -f database/migration_component_daily_stats.sql
+-- Обновление (ежедневно по cron после полуночи и после массовой загрузки):
+--   psql -d tnb_user_1_vsm400 -c "SELECT component_refresh_daily_stats()"
+
+CREATE TABLE IF NOT EXISTS component_daily_stats (
+    day DATE NOT NULL,
+    included_in_name VARCHAR(500),
+    supplier VARCHAR(300),
+    company_id INTEGER,
+    count BIGINT NOT NULL,
+    quantity BIGINT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_component_daily_stats_day ON component_daily_stats (day);
+
+-- Дни, изменённые после расчёта rollup
+CREATE TABLE IF NOT EXISTS component_daily_stats_dirty (
+    day DATE PRIMARY KEY
+);
+
+-- Rollup покрывает все дни раньше covered_until (NULL — rollup пуст)
+CREATE TABLE IF NOT EXISTS component_daily_stats_state (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    covered_until DATE,
+    refreshed_at TIMESTAMP
+);
+
+INSERT INTO component_daily_stats_state (id) VALUES (TRUE) ON CONFLICT (id) DO NOTHING;
+
+-- С какого дня счётчики считаются по сырым строкам: раньше этого дня — из rollup
+CREATE OR REPLACE FUNCTION component_daily_stats_horizon()
+RETURNS DATE AS $$
+    SELECT LEAST(
+        CURRENT_DATE,
+        COALESCE((SELECT covered_until FROM component_daily_stats_state), '-infinity'::date),
+        COALESCE((SELECT min(day) FROM component_daily_stats_dirty), 'infinity'::date)
+    )
+$$ LANGUAGE sql STABLE;
+
+-- Пересчитать закрытые дни, которых нет в rollup или которые изменились; возвращает число дней
+CREATE OR REPLACE FUNCTION component_refresh_daily_stats()
+RETURNS INTEGER AS $$
+DECLARE
+    v_today DATE := CURRENT_DATE;
+    v_covered DATE;
+    v_days DATE[];
+BEGIN
+    SELECT covered_until INTO v_covered FROM component_daily_stats_state FOR UPDATE;
+
+    WITH dirty AS (
+        DELETE FROM component_daily_stats_dirty WHERE day < v_today RETURNING day
+    )
+    SELECT array_agg(DISTINCT day) INTO v_days
+    FROM (
+        SELECT day FROM dirty
+        UNION ALL
+        SELECT DISTINCT created_at::date
+        FROM component
+        WHERE created_at >= COALESCE(v_covered, '-infinity'::date) AND created_at < v_today
+    ) d;
+
+    IF v_days IS NOT NULL THEN
+        DELETE FROM component_daily_stats WHERE day = ANY(v_days);
+        INSERT INTO component_daily_stats (day, included_in_name, supplier, company_id, count, quantity)
+        SELECT created_at::date, included_in_name, supplier, company_id, COUNT(*), COALESCE(SUM(quantity), 0)
+        FROM component
+        WHERE created_at IS NOT NULL AND created_at::date = ANY(v_days)
+        GROUP BY 1, 2, 3, 4;
+    END IF;
+
+    UPDATE component_daily_stats_state SET covered_until = v_today, refreshed_at = LOCALTIMESTAMP;
+    RETURN COALESCE(array_length(v_days, 1), 0);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Изменения строк прошлых дней помечают день; строки сегодняшнего дня rollup не затрагивают
+CREATE OR REPLACE FUNCTION component_mark_daily_stats_dirty()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO component_daily_stats_dirty (day)
+        SELECT DISTINCT created_at::date FROM new_rows
+        WHERE created_at < CURRENT_DATE
+        ON CONFLICT (day) DO NOTHING;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO component_daily_stats_dirty (day)
+        SELECT DISTINCT created_at::date FROM old_rows
+        WHERE created_at < CURRENT_DATE
+        ON CONFLICT (day) DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION component_reset_daily_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    DELETE FROM component_daily_stats;
+    DELETE FROM component_daily_stats_dirty;
+    UPDATE component_daily_stats_state SET covered_until = NULL;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Таблицы переходов допускают только одно событие на триггер
+DROP TRIGGER IF EXISTS component_daily_stats_insert ON component;
+CREATE TRIGGER component_daily_stats_insert
+    AFTER INSERT ON component
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION component_mark_daily_stats_dirty();
+
+DROP TRIGGER IF EXISTS component_daily_stats_update ON component;
+CREATE TRIGGER component_daily_stats_update
+    AFTER UPDATE ON component
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION component_mark_daily_stats_dirty();
+
+DROP TRIGGER IF EXISTS component_daily_stats_delete ON component;
+CREATE TRIGGER component_daily_stats_delete
+    AFTER DELETE ON component
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION component_mark_daily_stats_dirty();
+
+DROP TRIGGER IF EXISTS component_daily_stats_truncate ON component;
+CREATE TRIGGER component_daily_stats_truncate
+    AFTER TRUNCATE ON component
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION component_reset_daily_stats();
+
+SELECT component_refresh_daily_stats();
+
+COMMENT ON TABLE component_daily_stats IS 'Дневные агрегаты component за закрытые дни (rollup для /api/components/timeline)';
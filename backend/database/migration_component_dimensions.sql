@@ -0,0 +1,152 @@
+-- Справочники текстовых измерений component с целочисленными ключами
+-- supplier, object_type, included_in_name и included_in_object_type повторяются в каждой строке
+-- component. Их значения хранятся в справочнике component_dimension, а в component добавляются
+-- ключи supplier_id, object_type_id, included_in_name_id и included_in_object_type_id:
+-- агрегаты /api/components/metrics группируют по небольшим целым ключам и подтягивают названия
+-- только для итогового топа. Пустые строки и NULL получают ключ NULL (значение не указано).
+-- Текстовые столбцы остаются: по ним пишут загрузчики, фильтруют запросы API и синхронизируются
+-- лента изменений, колоночное зеркало и rollup-таблицы.
+--
+-- Применение (таблица блокируется на время перезаписи ключей существующих строк):
+--   psql -d tnb_user_1_vsm400 -f database/migration_component_dimensions.sql
+-- Ключи новых и изменённых строк проставляет триггер. При массовой загрузке его можно отключить
+-- и проставить ключи одним проходом после загрузки:
+--   ALTER TABLE component DISABLE TRIGGER component_dimension_keys;
+--   ... COPY / INSERT ...
+--   ALTER TABLE component ENABLE TRIGGER component_dimension_keys;
+--   SELECT component_refresh_dimensions();
+
+CREATE TABLE IF NOT EXISTS component_dimension (
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    kind VARCHAR(30) NOT NULL CHECK (kind IN ('supplier', 'object_type', 'included_in_name', 'included_in_object_type')),
+    name VARCHAR(500) NOT NULL CHECK (name <> ''),
+    UNIQUE (kind, name)
+);
+
+-- Ключ значения измерения без создания (NULL для пустой строки, NULL и неизвестного значения)
+CREATE OR REPLACE FUNCTION component_dimension_id(p_kind TEXT, p_name TEXT)
+RETURNS INTEGER AS $$
+    SELECT id FROM component_dimension WHERE kind = p_kind AND name = NULLIF(p_name, '')
+$$ LANGUAGE sql STABLE;
+
+-- Ключ значения измерения; новое значение добавляется в справочник
+CREATE OR REPLACE FUNCTION component_dimension_key(p_kind TEXT, p_name TEXT)
+RETURNS INTEGER AS $$
+DECLARE
+    v_id INTEGER;
+BEGIN
+    IF p_name IS NULL OR p_name = '' THEN
+        RETURN NULL;
+    END IF;
+    SELECT id INTO v_id FROM component_dimension WHERE kind = p_kind AND name = p_name;
+    IF v_id IS NULL THEN
+        INSERT INTO component_dimension (kind, name) VALUES (p_kind, p_name)
+        ON CONFLICT (kind, name) DO NOTHING
+        RETURNING id INTO v_id;
+        -- Значение одновременно добавила другая транзакция
+        IF v_id IS NULL THEN
+            SELECT id INTO v_id FROM component_dimension WHERE kind = p_kind AND name = p_name;
+        END IF;
+    END IF;
+    RETURN v_id;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION component_set_dimension_keys()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.supplier_id := component_dimension_key('supplier', NEW.supplier);
+    NEW.object_type_id := component_dimension_key('object_type', NEW.object_type);
+    NEW.included_in_name_id := component_dimension_key('included_in_name', NEW.included_in_name);
+    NEW.included_in_object_type_id := component_dimension_key('included_in_object_type', NEW.included_in_object_type);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Проставить ключи строкам, у которых они не совпадают с текстом (после загрузки с отключённым
+-- триггером); возвращает число исправленных ключей. Исправленные строки получают новый
+-- updated_at и попадают в ленту изменений.
+CREATE OR REPLACE FUNCTION component_refresh_dimensions()
+RETURNS BIGINT AS $$
+DECLARE
+    v_kind TEXT;
+    v_fixed BIGINT := 0;
+    v_rows BIGINT;
+BEGIN
+    FOREACH v_kind IN ARRAY ARRAY['supplier', 'object_type', 'included_in_name', 'included_in_object_type'] LOOP
+        EXECUTE format(
+            'INSERT INTO component_dimension (kind, name) '
+            'SELECT %L, %I FROM component WHERE %I <> %L GROUP BY %I '
+            'ON CONFLICT (kind, name) DO NOTHING',
+            v_kind, v_kind, v_kind, '', v_kind
+        );
+        EXECUTE format(
+            'UPDATE component c SET %I = d.id FROM component_dimension d '
+            'WHERE d.kind = %L AND d.name = c.%I AND c.%I IS DISTINCT FROM d.id',
+            v_kind || '_id', v_kind, v_kind, v_kind || '_id'
+        );
+        GET DIAGNOSTICS v_rows = ROW_COUNT;
+        v_fixed := v_fixed + v_rows;
+        EXECUTE format(
+            'UPDATE component SET %I = NULL WHERE %I IS NOT NULL AND (%I IS NULL OR %I = %L)',
+            v_kind || '_id', v_kind || '_id', v_kind, v_kind, ''
+        );
+        GET DIAGNOSTICS v_rows = ROW_COUNT;
+        v_fixed := v_fixed + v_rows;
+    END LOOP;
+    RETURN v_fixed;
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE component
+    ADD COLUMN IF NOT EXISTS supplier_id INTEGER,
+    ADD COLUMN IF NOT EXISTS object_type_id INTEGER,
+    ADD COLUMN IF NOT EXISTS included_in_name_id INTEGER,
+    ADD COLUMN IF NOT EXISTS included_in_object_type_id INTEGER;
+
+-- С этого момента ключи новых и изменённых строк проставляет триггер
+DROP TRIGGER IF EXISTS component_dimension_keys ON component;
+CREATE TRIGGER component_dimension_keys
+    BEFORE INSERT OR UPDATE OF supplier, object_type, included_in_name, included_in_object_type ON component
+    FOR EACH ROW
+    EXECUTE FUNCTION component_set_dimension_keys();
+
+INSERT INTO component_dimension (kind, name)
+SELECT 'supplier', supplier FROM component WHERE supplier <> '' GROUP BY supplier
+UNION ALL
+SELECT 'object_type', object_type FROM component WHERE object_type <> '' GROUP BY object_type
+UNION ALL
+SELECT 'included_in_name', included_in_name FROM component WHERE included_in_name <> '' GROUP BY included_in_name
+UNION ALL
+SELECT 'included_in_object_type', included_in_object_type FROM component WHERE included_in_object_type <> '' GROUP BY included_in_object_type
+ON CONFLICT (kind, name) DO NOTHING;
+
+-- Ключи существующих строк: перезапись таблицы через ALTER COLUMN ... USING не вызывает
+-- строковых триггеров (updated_at и лента изменений не меняются — данные те же) и не оставляет
+-- мёртвых версий строк, как UPDATE всей таблицы. При повторном применении пропускается.
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM component
+        WHERE (supplier_id IS NULL AND supplier <> '')
+           OR (object_type_id IS NULL AND object_type <> '')
+           OR (included_in_name_id IS NULL AND included_in_name <> '')
+           OR (included_in_object_type_id IS NULL AND included_in_object_type <> '')
+    ) THEN
+        ALTER TABLE component
+            ALTER COLUMN supplier_id TYPE INTEGER
+                USING component_dimension_id('supplier', supplier),
+            ALTER COLUMN object_type_id TYPE INTEGER
+                USING component_dimension_id('object_type', object_type),
+            ALTER COLUMN included_in_name_id TYPE INTEGER
+                USING component_dimension_id('included_in_name', included_in_name),
+            ALTER COLUMN included_in_object_type_id TYPE INTEGER
+                USING component_dimension_id('included_in_object_type', included_in_object_type);
+    END IF;
+END;
+$$;
+
+ANALYZE component;
+ANALYZE component_dimension;
+
+COMMENT ON TABLE component_dimension IS 'Справочник значений текстовых измерений component (ключи *_id в component)';
@@ -0,0 +1,148 @@
+-- Кэш помесячных агрегатов component для закрытых месяцев
+-- Прошлые месяцы почти не меняются: их счётчики хранятся в component_month_stats в разрезе
+-- фильтров API (included_in_name, supplier, company_id), а по сырым строкам считается только
+-- хвост начиная с component_month_stats_horizon() — обычно текущий месяц (с секционированием
+-- это одна секция). Изменения строк прошлых месяцев помечают месяц как изменённый, и он
+-- считается по сырым строкам до следующего обновления кэша.
+--
+-- Применение:
+--   psql -d tnb_user_1_vsm400 -f database/migration_component_month_stats.sql
+-- Обновление кэша (ежедневно по cron и после массовой загрузки):
+--   psql -d tnb_user_1_vsm400 -c "SELECT component_refresh_month_stats()"
+
+CREATE TABLE IF NOT EXISTS component_month_stats (
+    month TIMESTAMP NOT NULL,
+    included_in_name VARCHAR(500),
+    supplier VARCHAR(300),
+    company_id INTEGER,
+    count BIGINT NOT NULL,
+    quantity BIGINT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_component_month_stats_month ON component_month_stats (month);
+
+-- Месяцы, изменённые после расчёта кэша
+CREATE TABLE IF NOT EXISTS component_month_stats_dirty (
+    month TIMESTAMP PRIMARY KEY
+);
+
+-- Кэш покрывает все месяцы раньше covered_until (NULL — кэш пуст)
+CREATE TABLE IF NOT EXISTS component_month_stats_state (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    covered_until TIMESTAMP,
+    refreshed_at TIMESTAMP
+);
+
+INSERT INTO component_month_stats_state (id) VALUES (TRUE) ON CONFLICT (id) DO NOTHING;
+
+-- С какого момента агрегаты считаются по сырым строкам: раньше этой даты — из кэша
+CREATE OR REPLACE FUNCTION component_month_stats_horizon()
+RETURNS TIMESTAMP AS $$
+    SELECT LEAST(
+        date_trunc('month', LOCALTIMESTAMP),
+        COALESCE((SELECT covered_until FROM component_month_stats_state), '-infinity'::timestamp),
+        COALESCE((SELECT min(month) FROM component_month_stats_dirty), 'infinity'::timestamp)
+    )
+$$ LANGUAGE sql STABLE;
+
+-- Пересчитать закрытые месяцы, которых нет в кэше или которые изменились; возвращает число месяцев
+CREATE OR REPLACE FUNCTION component_refresh_month_stats()
+RETURNS INTEGER AS $$
+DECLARE
+    v_current TIMESTAMP := date_trunc('month', LOCALTIMESTAMP);
+    v_covered TIMESTAMP;
+    v_months TIMESTAMP[];
+BEGIN
+    SELECT covered_until INTO v_covered FROM component_month_stats_state FOR UPDATE;
+
+    WITH dirty AS (
+        DELETE FROM component_month_stats_dirty WHERE month < v_current RETURNING month
+    )
+    SELECT array_agg(DISTINCT month) INTO v_months
+    FROM (
+        SELECT month FROM dirty
+        UNION ALL
+        SELECT DISTINCT date_trunc('month', created_at)
+        FROM component
+        WHERE created_at >= COALESCE(v_covered, '-infinity'::timestamp) AND created_at < v_current
+    ) m;
+
+    IF v_months IS NOT NULL THEN
+        DELETE FROM component_month_stats WHERE month = ANY(v_months);
+        INSERT INTO component_month_stats (month, included_in_name, supplier, company_id, count, quantity)
+        SELECT date_trunc('month', created_at), included_in_name, supplier, company_id,
+               COUNT(*), COALESCE(SUM(quantity), 0)
+        FROM component
+        WHERE created_at IS NOT NULL AND date_trunc('month', created_at) = ANY(v_months)
+        GROUP BY 1, 2, 3, 4;
+    END IF;
+    -- Месяцы без строк тоже покрыты кэшем (в нём для них просто нет записей)
+    DELETE FROM component_month_stats WHERE month >= COALESCE(v_covered, '-infinity'::timestamp) AND month < v_current
+        AND NOT (month = ANY(COALESCE(v_months, '{}')));
+
+    UPDATE component_month_stats_state SET covered_until = v_current, refreshed_at = LOCALTIMESTAMP;
+    RETURN COALESCE(array_length(v_months, 1), 0);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Изменения строк закрытых месяцев помечают месяц; строки текущего месяца кэш не затрагивают
+CREATE OR REPLACE FUNCTION component_mark_month_stats_dirty()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO component_month_stats_dirty (month)
+        SELECT DISTINCT date_trunc('month', created_at) FROM new_rows
+        WHERE created_at < date_trunc('month', LOCALTIMESTAMP)
+        ON CONFLICT (month) DO NOTHING;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO component_month_stats_dirty (month)
+        SELECT DISTINCT date_trunc('month', created_at) FROM old_rows
+        WHERE created_at < date_trunc('month', LOCALTIMESTAMP)
+        ON CONFLICT (month) DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION component_reset_month_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    DELETE FROM component_month_stats;
+    DELETE FROM component_month_stats_dirty;
+    UPDATE component_month_stats_state SET covered_until = NULL;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Таблицы переходов допускают только одно событие на триггер
+DROP TRIGGER IF EXISTS component_month_stats_insert ON component;
+CREATE TRIGGER component_month_stats_insert
+    AFTER INSERT ON component
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION component_mark_month_stats_dirty();
+
+DROP TRIGGER IF EXISTS component_month_stats_update ON component;
+CREATE TRIGGER component_month_stats_update
+    AFTER UPDATE ON component
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION component_mark_month_stats_dirty();
+
+DROP TRIGGER IF EXISTS component_month_stats_delete ON component;
+CREATE TRIGGER component_month_stats_delete
+    AFTER DELETE ON component
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION component_mark_month_stats_dirty();
+
+DROP TRIGGER IF EXISTS component_month_stats_truncate ON component;
+CREATE TRIGGER component_month_stats_truncate
+    AFTER TRUNCATE ON component
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION component_reset_month_stats();
+
+SELECT component_refresh_month_stats();
+
+COMMENT ON TABLE component_month_stats IS 'Помесячные агрегаты component за закрытые месяцы (кэш для динамики по месяцам)';
@@ -0,0 +1,259 @@
+-- Секционирование таблицы component по месяцам created_at
+-- Таблица превращается в секционированную (PARTITION BY RANGE (created_at)): одна секция
+-- component_pYYYYMM на месяц плюс component_default для строк без даты и вне созданных секций.
+-- Запросы с условием на created_at (динамика по месяцам, метрики за период) читают только
+-- нужные секции.
+--
+-- Применение (таблица блокируется на время копирования данных):
+--   psql -d tnb_user_1_vsm400 -f database/migration_component_partitioning.sql
+-- Старая таблица остаётся как component_unpartitioned (её индексы переименовываются с суффиксом
+-- _unpartitioned); после проверки её можно удалить:
+--   DROP TABLE component_unpartitioned;
+-- Индексы и триггеры, созданные на component другими миграциями (лента изменений, rollup-таблицы,
+-- справочники измерений, BRIN), переносятся на новую таблицу — миграцию можно применять в любом
+-- порядке относительно них.
+-- Первичный ключ секционированной таблицы должен включать created_at, а created_at может быть
+-- NULL, поэтому уникальность id обеспечивает таблица component_id_key (id PRIMARY KEY): её
+-- заполняют триггеры вставки, изменения и удаления component. Курсоры по id (лента изменений,
+-- колоночное зеркало, /api/companies/batch) по-прежнему видят один id у одной строки.
+-- Новые секции создаются заранее (ежедневно по cron):
+--   psql -d tnb_user_1_vsm400 -c "SELECT component_ensure_partitions(3)"
+
+-- Создать секцию месяца; строки этого месяца из component_default переносятся в неё
+CREATE OR REPLACE FUNCTION component_create_month_partition(p_month TIMESTAMP)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_from TIMESTAMP := date_trunc('month', p_month);
+    v_to TIMESTAMP := date_trunc('month', p_month) + INTERVAL '1 month';
+    v_name TEXT := 'component_p' || to_char(date_trunc('month', p_month), 'YYYYMM');
+BEGIN
+    IF to_regclass(v_name) IS NOT NULL THEN
+        RETURN FALSE;
+    END IF;
+    EXECUTE format('CREATE TABLE %I (LIKE component INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', v_name);
+    IF to_regclass('component_default') IS NOT NULL THEN
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM component_default WHERE created_at >= %L AND created_at < %L RETURNING *) '
+            'INSERT INTO %I SELECT * FROM moved',
+            v_from, v_to, v_name
+        );
+    END IF;
+    EXECUTE format('ALTER TABLE component ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', v_name, v_from, v_to);
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Секции на текущий и p_months_ahead следующих месяцев, а также для месяцев,
+-- строки которых попали в component_default; возвращает число созданных секций
+CREATE OR REPLACE FUNCTION component_ensure_partitions(p_months_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    v_month TIMESTAMP;
+    v_created INTEGER := 0;
+BEGIN
+    FOR v_month IN
+        SELECT generate_series(
+            date_trunc('month', LOCALTIMESTAMP),
+            date_trunc('month', LOCALTIMESTAMP) + make_interval(months => p_months_ahead),
+            INTERVAL '1 month'
+        )
+        UNION
+        SELECT DISTINCT date_trunc('month', created_at) FROM component_default WHERE created_at IS NOT NULL
+    LOOP
+        IF component_create_month_partition(v_month) THEN
+            v_created := v_created + 1;
+        END IF;
+    END LOOP;
+    RETURN v_created;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    v_columns TEXT;
+    v_month TIMESTAMP;
+    v_constraint RECORD;
+    v_column RECORD;
+    v_sequence TEXT;
+    v_index RECORD;
+    v_trigger RECORD;
+BEGIN
+    IF to_regclass('public.component') IS NULL THEN
+        RAISE EXCEPTION 'table component does not exist';
+    END IF;
+    IF (SELECT relkind FROM pg_class WHERE oid = 'public.component'::regclass) = 'p' THEN
+        RAISE NOTICE 'component is already partitioned';
+        RETURN;
+    END IF;
+    -- Внешний ключ на component.id требует уникального индекса на родительской таблице
+    IF EXISTS (SELECT 1 FROM pg_constraint WHERE contype = 'f' AND confrelid = 'public.component'::regclass) THEN
+        RAISE EXCEPTION 'component is referenced by foreign keys, drop them before partitioning';
+    END IF;
+
+    LOCK TABLE component IN ACCESS EXCLUSIVE MODE;
+    ALTER TABLE component RENAME TO component_unpartitioned;
+
+    -- Имена индексов общие для схемы: индексы старой таблицы переименовываются, чтобы такие же
+    -- индексы новой таблицы можно было создать под прежними именами
+    CREATE TEMP TABLE component_partitioning_indexes ON COMMIT DROP AS
+    SELECT c.relname AS name, i.indisprimary AS is_primary, i.indisunique AS is_unique,
+           regexp_replace(pg_get_indexdef(i.indexrelid), '^.*? USING ', '') AS definition,
+           EXISTS (
+               SELECT 1 FROM pg_attribute a
+               WHERE a.attrelid = i.indrelid AND a.attname = 'created_at' AND a.attnum = ANY (i.indkey)
+           ) AS has_created_at
+    FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indexrelid
+    WHERE i.indrelid = 'component_unpartitioned'::regclass;
+    FOR v_index IN SELECT name FROM component_partitioning_indexes LOOP
+        EXECUTE format('ALTER INDEX %I RENAME TO %I', v_index.name, left(v_index.name, 49) || '_unpartitioned');
+    END LOOP;
+
+    CREATE TABLE component (LIKE component_unpartitioned INCLUDING ALL EXCLUDING INDEXES)
+        PARTITION BY RANGE (created_at);
+    CREATE TABLE component_default PARTITION OF component DEFAULT;
+
+    FOR v_month IN
+        SELECT DISTINCT date_trunc('month', created_at) FROM component_unpartitioned WHERE created_at IS NOT NULL
+    LOOP
+        PERFORM component_create_month_partition(v_month);
+    END LOOP;
+    PERFORM component_ensure_partitions(3);
+
+    SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) INTO v_columns
+    FROM pg_attribute
+    WHERE attrelid = 'component_unpartitioned'::regclass AND attnum > 0 AND NOT attisdropped AND attgenerated = '';
+    EXECUTE format(
+        'INSERT INTO component (%s) OVERRIDING SYSTEM VALUE SELECT %s FROM component_unpartitioned',
+        v_columns, v_columns
+    );
+
+    -- Последовательности: serial переходит к новой таблице, identity продолжает нумерацию
+    FOR v_column IN
+        SELECT attname, attidentity FROM pg_attribute
+        WHERE attrelid = 'component_unpartitioned'::regclass AND attnum > 0 AND NOT attisdropped
+    LOOP
+        v_sequence := pg_get_serial_sequence('component_unpartitioned', v_column.attname);
+        IF v_sequence IS NOT NULL AND v_column.attidentity = '' THEN
+            EXECUTE format('ALTER SEQUENCE %s OWNED BY component.%I', v_sequence, v_column.attname);
+        ELSIF v_column.attidentity <> '' THEN
+            EXECUTE format(
+                'SELECT setval(%L, COALESCE((SELECT max(%I) FROM component), 0) + 1, false)',
+                pg_get_serial_sequence('component', v_column.attname), v_column.attname
+            );
+        END IF;
+    END LOOP;
+
+    -- Внешние ключи (например, company_id → company.id)
+    FOR v_constraint IN
+        SELECT conname, pg_get_constraintdef(oid) AS definition
+        FROM pg_constraint
+        WHERE conrelid = 'component_unpartitioned'::regclass AND contype = 'f'
+    LOOP
+        EXECUTE format('ALTER TABLE component_unpartitioned DROP CONSTRAINT %I', v_constraint.conname);
+        EXECUTE format('ALTER TABLE component ADD CONSTRAINT %I %s', v_constraint.conname, v_constraint.definition);
+    END LOOP;
+
+    -- Индексы старой таблицы создаются на родительской таблице и наследуются всеми секциями.
+    -- Уникальный индекс без created_at в секционированной таблице невозможен: он становится
+    -- обычным, первичный ключ по id — индексом idx_component_id и таблицей component_id_key (ниже)
+    FOR v_index IN SELECT * FROM component_partitioning_indexes WHERE NOT is_primary LOOP
+        EXECUTE format(
+            'CREATE %sINDEX %I ON component USING %s',
+            CASE WHEN v_index.is_unique AND v_index.has_created_at THEN 'UNIQUE ' ELSE '' END,
+            v_index.name, v_index.definition
+        );
+    END LOOP;
+
+    -- Триггеры других миграций (версия данных, updated_at и надгробия ленты изменений, rollup-таблицы,
+    -- ключи справочников) переносятся после копирования данных — копирование их не вызывает
+    FOR v_trigger IN
+        SELECT tgname, pg_get_triggerdef(oid) AS definition
+        FROM pg_trigger
+        WHERE tgrelid = 'component_unpartitioned'::regclass AND NOT tgisinternal
+    LOOP
+        EXECUTE format('DROP TRIGGER %I ON component_unpartitioned', v_trigger.tgname);
+        EXECUTE regexp_replace(v_trigger.definition, ' ON (public\.)?component_unpartitioned ', ' ON component ');
+    END LOOP;
+END;
+$$;
+
+-- Уникальность id: первичный ключ component_id_key. Триггеры уровня оператора получают
+-- изменённые строки одной таблицей переходов; повтор id — ошибка unique_violation в той же команде
+CREATE TABLE IF NOT EXISTS component_id_key (id BIGINT PRIMARY KEY);
+
+CREATE OR REPLACE FUNCTION component_id_key_sync()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO component_id_key (id) SELECT id FROM new_rows;
+    ELSIF TG_OP = 'UPDATE' THEN
+        -- EXCEPT ALL: два изменённых id с одним значением дают две вставки и ошибку
+        DELETE FROM component_id_key k
+        USING (SELECT id FROM old_rows EXCEPT ALL SELECT id FROM new_rows) o
+        WHERE k.id = o.id;
+        INSERT INTO component_id_key (id) SELECT id FROM new_rows EXCEPT ALL SELECT id FROM old_rows;
+    ELSIF TG_OP = 'DELETE' THEN
+        DELETE FROM component_id_key k USING old_rows o WHERE k.id = o.id;
+    ELSE
+        TRUNCATE component_id_key;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Триггеры и ключи существующих строк — в одной транзакции под блокировкой записи в component
+-- (при повторном применении добавляются только недостающие ключи)
+DO $$
+DECLARE
+    v_duplicate BIGINT;
+BEGIN
+    LOCK TABLE component IN SHARE ROW EXCLUSIVE MODE;
+
+    DROP TRIGGER IF EXISTS component_id_key_insert ON component;
+    CREATE TRIGGER component_id_key_insert
+        AFTER INSERT ON component
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION component_id_key_sync();
+
+    DROP TRIGGER IF EXISTS component_id_key_update ON component;
+    CREATE TRIGGER component_id_key_update
+        AFTER UPDATE ON component
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION component_id_key_sync();
+
+    DROP TRIGGER IF EXISTS component_id_key_delete ON component;
+    CREATE TRIGGER component_id_key_delete
+        AFTER DELETE ON component
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION component_id_key_sync();
+
+    DROP TRIGGER IF EXISTS component_id_key_truncate ON component;
+    CREATE TRIGGER component_id_key_truncate
+        AFTER TRUNCATE ON component
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION component_id_key_sync();
+
+    SELECT id INTO v_duplicate FROM component GROUP BY id HAVING COUNT(*) > 1 LIMIT 1;
+    IF v_duplicate IS NOT NULL THEN
+        RAISE EXCEPTION 'component.id % is not unique, remove duplicates first', v_duplicate;
+    END IF;
+    INSERT INTO component_id_key (id) SELECT id FROM component ON CONFLICT (id) DO NOTHING;
+    DELETE FROM component_id_key k WHERE NOT EXISTS (SELECT 1 FROM component c WHERE c.id = k.id);
+END;
+$$;
+
+-- Индексы, которых не было у старой таблицы:
+CREATE INDEX IF NOT EXISTS idx_component_id ON component (id);
+CREATE INDEX IF NOT EXISTS idx_component_created_at ON component (created_at);
+CREATE INDEX IF NOT EXISTS idx_component_included_in_name ON component (included_in_name);
+CREATE INDEX IF NOT EXISTS idx_component_supplier ON component (supplier);
+CREATE INDEX IF NOT EXISTS idx_component_company_id ON component (company_id);
+
+ANALYZE component;
+
+COMMENT ON TABLE component_id_key IS 'Уникальные id секционированной component (триггеры component_id_key_*)';
+COMMENT ON TABLE component_default IS 'Секция component для строк без created_at и вне созданных месячных секций';
@@ -0,0 +1,38 @@
+-- Версия данных для инвалидации снимков и кэшей API
+-- Каждое изменение таблиц company и component увеличивает счётчик version.
+-- Применение: psql -d tnb_user_1_vsm400 -f database/migration_data_version.sql
+
+CREATE TABLE IF NOT EXISTS data_version (
+    table_name VARCHAR(100) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO data_version (table_name) VALUES ('company'), ('component')
+ON CONFLICT (table_name) DO NOTHING;
+
+-- Триггер уровня оператора: один UPDATE счётчика на INSERT/UPDATE/DELETE/TRUNCATE,
+-- независимо от числа затронутых строк
+CREATE OR REPLACE FUNCTION bump_data_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE data_version
+    SET version = version + 1, changed_at = CURRENT_TIMESTAMP
+    WHERE table_name = TG_TABLE_NAME;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS company_data_version ON company;
+CREATE TRIGGER company_data_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON company
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version();
+
+DROP TRIGGER IF EXISTS component_data_version ON component;
+CREATE TRIGGER component_data_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON component
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION bump_data_version();
+
+COMMENT ON TABLE data_version IS 'Счётчики изменений таблиц (версия данных для кэшей и снимков API)';
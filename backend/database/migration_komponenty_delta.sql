@@ -0,0 +1,30 @@
+-- Дельты komponenty между периодами (current / previous) для /api/komponenty/deltas
+-- Оба периода читаются одним проходом по покрывающему индексу: в нём есть все столбцы,
+-- которые нужны для агрегатов, поэтому таблица читается index-only scan.
+-- Изменения komponenty увеличивают свой счётчик data_version: дельты кэшируются до следующего
+-- изменения komponenty, общая версия данных (company, component) и кэши дашборда не меняются.
+--
+-- Применение (после database/schema.sql и database/migration_data_version.sql):
+--   psql -d tnb_user_1_vsm400 -f database/migration_komponenty_delta.sql
+
+CREATE INDEX IF NOT EXISTS idx_komponenty_period_delta
+    ON komponenty (period, kompaniya_id, nazvanie) INCLUDE (status, progress, is_risk);
+
+DO $$
+BEGIN
+    IF to_regproc('bump_data_version') IS NULL THEN
+        RAISE NOTICE 'data_version is not set up, apply database/migration_data_version.sql first';
+        RETURN;
+    END IF;
+    INSERT INTO data_version (table_name) VALUES ('komponenty') ON CONFLICT (table_name) DO NOTHING;
+    DROP TRIGGER IF EXISTS komponenty_data_version ON komponenty;
+    CREATE TRIGGER komponenty_data_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON komponenty
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION bump_data_version();
+END;
+$$;
+
+-- VACUUM нельзя выполнять в транзакции (psql -1); карту видимости для index-only scan
+-- обновит autovacuum или отдельный VACUUM komponenty
+ANALYZE komponenty;
@@ -0,0 +1,258 @@
+-- Предрасчитанная экспозиция рисков для /api/risks/matrix и /api/risks/top
+-- Экспозиция открытого риска (статус «Открыт» или «В работе») = veroyatnost × вес vliyanie
+-- (Низкое 1, Среднее 2, Высокое 3, Критическое 4); у закрытых рисков экспозиция 0.
+-- Матрица вероятность × влияние, счётчики по категориям и экспозиция компонентов и компаний
+-- хранятся в таблицах risk_* и обновляются триггерами riski на разницу старой и новой строки,
+-- поэтому API читает готовые строки без агрегации по riski.
+--
+-- Применение (после database/schema.sql):
+--   psql -d tnb_user_1_vsm400 -f database/migration_risk_exposure.sql
+-- Полный пересчёт (после загрузки данных с отключёнными триггерами или для проверки):
+--   psql -d tnb_user_1_vsm400 -c "SELECT risk_exposure_rebuild()"
+
+-- Ячейки матрицы: prob_bin — номер интервала вероятности шириной 0.2 (0 — [0; 0.2), 4 — [0.8; 1])
+CREATE TABLE IF NOT EXISTS risk_matrix (
+    prob_bin SMALLINT NOT NULL,
+    vliyanie VARCHAR(20) NOT NULL,
+    open_count INTEGER NOT NULL DEFAULT 0,
+    total_count INTEGER NOT NULL DEFAULT 0,
+    exposure NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (prob_bin, vliyanie)
+);
+
+CREATE TABLE IF NOT EXISTS risk_category_stats (
+    kategoriya VARCHAR(50) PRIMARY KEY,
+    open_count INTEGER NOT NULL DEFAULT 0,
+    total_count INTEGER NOT NULL DEFAULT 0,
+    exposure NUMERIC NOT NULL DEFAULT 0
+);
+
+-- kompaniya_id — компания, на которую записана экспозиция компонента
+CREATE TABLE IF NOT EXISTS risk_component_exposure (
+    komponent_id INTEGER PRIMARY KEY,
+    kompaniya_id INTEGER,
+    open_count INTEGER NOT NULL DEFAULT 0,
+    total_count INTEGER NOT NULL DEFAULT 0,
+    exposure NUMERIC NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS risk_company_exposure (
+    kompaniya_id INTEGER PRIMARY KEY,
+    open_count INTEGER NOT NULL DEFAULT 0,
+    total_count INTEGER NOT NULL DEFAULT 0,
+    exposure NUMERIC NOT NULL DEFAULT 0
+);
+
+-- Топ по экспозиции читается по индексу без сортировки
+CREATE INDEX IF NOT EXISTS idx_risk_component_exposure_top ON risk_component_exposure (exposure DESC, komponent_id);
+CREATE INDEX IF NOT EXISTS idx_risk_company_exposure_top ON risk_company_exposure (exposure DESC, kompaniya_id);
+
+CREATE OR REPLACE FUNCTION risk_impact_weight(p_vliyanie VARCHAR)
+RETURNS NUMERIC AS $$
+    SELECT CASE p_vliyanie
+        WHEN 'Низкое' THEN 1
+        WHEN 'Среднее' THEN 2
+        WHEN 'Высокое' THEN 3
+        WHEN 'Критическое' THEN 4
+        ELSE 0
+    END::numeric
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION risk_prob_bin(p_veroyatnost NUMERIC)
+RETURNS SMALLINT AS $$
+    SELECT LEAST(floor(p_veroyatnost * 5), 4)::smallint
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Добавить (p_sign = 1) или вычесть (p_sign = -1) вклад одного риска во все таблицы
+CREATE OR REPLACE FUNCTION risk_exposure_apply(
+    p_sign INTEGER,
+    p_komponent_id INTEGER,
+    p_kategoriya VARCHAR,
+    p_veroyatnost NUMERIC,
+    p_vliyanie VARCHAR,
+    p_status VARCHAR
+)
+RETURNS VOID AS $$
+DECLARE
+    v_open INTEGER := CASE WHEN COALESCE(p_status, 'Открыт') <> 'Закрыт' THEN p_sign ELSE 0 END;
+    v_exposure NUMERIC := v_open * COALESCE(p_veroyatnost, 0) * risk_impact_weight(p_vliyanie);
+    v_kompaniya_id INTEGER;
+BEGIN
+    IF p_veroyatnost IS NOT NULL AND p_vliyanie IS NOT NULL THEN
+        INSERT INTO risk_matrix AS m (prob_bin, vliyanie, open_count, total_count, exposure)
+        VALUES (risk_prob_bin(p_veroyatnost), p_vliyanie, v_open, p_sign, v_exposure)
+        ON CONFLICT (prob_bin, vliyanie) DO UPDATE SET
+            open_count = m.open_count + EXCLUDED.open_count,
+            total_count = m.total_count + EXCLUDED.total_count,
+            exposure = m.exposure + EXCLUDED.exposure;
+    END IF;
+
+    INSERT INTO risk_category_stats AS c (kategoriya, open_count, total_count, exposure)
+    VALUES (p_kategoriya, v_open, p_sign, v_exposure)
+    ON CONFLICT (kategoriya) DO UPDATE SET
+        open_count = c.open_count + EXCLUDED.open_count,
+        total_count = c.total_count + EXCLUDED.total_count,
+        exposure = c.exposure + EXCLUDED.exposure;
+
+    IF p_komponent_id IS NULL THEN
+        RETURN;
+    END IF;
+
+    -- Компания берётся из уже записанной строки компонента: при каскадном удалении
+    -- компонента его строки в komponenty уже не видно
+    INSERT INTO risk_component_exposure AS e (komponent_id, kompaniya_id, open_count, total_count, exposure)
+    VALUES (
+        p_komponent_id,
+        (SELECT kompaniya_id FROM komponenty WHERE id = p_komponent_id),
+        v_open, p_sign, v_exposure
+    )
+    ON CONFLICT (komponent_id) DO UPDATE SET
+        open_count = e.open_count + EXCLUDED.open_count,
+        total_count = e.total_count + EXCLUDED.total_count,
+        exposure = e.exposure + EXCLUDED.exposure
+    RETURNING kompaniya_id INTO v_kompaniya_id;
+    DELETE FROM risk_component_exposure WHERE komponent_id = p_komponent_id AND total_count = 0;
+
+    IF v_kompaniya_id IS NOT NULL THEN
+        INSERT INTO risk_company_exposure AS e (kompaniya_id, open_count, total_count, exposure)
+        VALUES (v_kompaniya_id, v_open, p_sign, v_exposure)
+        ON CONFLICT (kompaniya_id) DO UPDATE SET
+            open_count = e.open_count + EXCLUDED.open_count,
+            total_count = e.total_count + EXCLUDED.total_count,
+            exposure = e.exposure + EXCLUDED.exposure;
+        DELETE FROM risk_company_exposure WHERE kompaniya_id = v_kompaniya_id AND total_count = 0;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION risk_exposure_track()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM risk_exposure_apply(-1, OLD.komponent_id, OLD.kategoriya, OLD.veroyatnost, OLD.vliyanie, OLD.status);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM risk_exposure_apply(1, NEW.komponent_id, NEW.kategoriya, NEW.veroyatnost, NEW.vliyanie, NEW.status);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Пересчитать все таблицы по riski; возвращает число рисков
+CREATE OR REPLACE FUNCTION risk_exposure_rebuild()
+RETURNS INTEGER AS $$
+DECLARE
+    v_count INTEGER;
+BEGIN
+    -- Изменения riski ждут окончания пересчёта, иначе их вклад потерялся бы
+    LOCK TABLE riski IN SHARE MODE;
+    DELETE FROM risk_matrix;
+    DELETE FROM risk_category_stats;
+    DELETE FROM risk_component_exposure;
+    DELETE FROM risk_company_exposure;
+
+    CREATE TEMP TABLE risk_exposure_rows ON COMMIT DROP AS
+    SELECT r.komponent_id, k.kompaniya_id, r.kategoriya, r.veroyatnost, r.vliyanie,
+           CASE WHEN COALESCE(r.status, 'Открыт') <> 'Закрыт' THEN 1 ELSE 0 END AS is_open,
+           CASE WHEN COALESCE(r.status, 'Открыт') <> 'Закрыт'
+                THEN COALESCE(r.veroyatnost, 0) * risk_impact_weight(r.vliyanie) ELSE 0 END AS exposure
+    FROM riski r
+    LEFT JOIN komponenty k ON k.id = r.komponent_id;
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+
+    INSERT INTO risk_matrix (prob_bin, vliyanie, open_count, total_count, exposure)
+    SELECT risk_prob_bin(veroyatnost), vliyanie, SUM(is_open), COUNT(*), SUM(exposure)
+    FROM risk_exposure_rows
+    WHERE veroyatnost IS NOT NULL AND vliyanie IS NOT NULL
+    GROUP BY 1, 2;
+
+    INSERT INTO risk_category_stats (kategoriya, open_count, total_count, exposure)
+    SELECT kategoriya, SUM(is_open), COUNT(*), SUM(exposure)
+    FROM risk_exposure_rows
+    GROUP BY 1;
+
+    INSERT INTO risk_component_exposure (komponent_id, kompaniya_id, open_count, total_count, exposure)
+    SELECT komponent_id, MIN(kompaniya_id), SUM(is_open), COUNT(*), SUM(exposure)
+    FROM risk_exposure_rows
+    WHERE komponent_id IS NOT NULL
+    GROUP BY 1;
+
+    INSERT INTO risk_company_exposure (kompaniya_id, open_count, total_count, exposure)
+    SELECT kompaniya_id, SUM(is_open), COUNT(*), SUM(exposure)
+    FROM risk_exposure_rows
+    WHERE komponent_id IS NOT NULL AND kompaniya_id IS NOT NULL
+    GROUP BY 1;
+
+    DROP TABLE risk_exposure_rows;
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION risk_exposure_reset()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM risk_exposure_rebuild();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Перенос экспозиции компонента при смене компании
+CREATE OR REPLACE FUNCTION risk_exposure_move_component()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_old_kompaniya_id INTEGER;
+    v_row risk_component_exposure%ROWTYPE;
+BEGIN
+    SELECT kompaniya_id INTO v_old_kompaniya_id
+    FROM risk_component_exposure WHERE komponent_id = NEW.id FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+    UPDATE risk_component_exposure SET kompaniya_id = NEW.kompaniya_id
+    WHERE komponent_id = NEW.id
+    RETURNING * INTO v_row;
+
+    IF v_old_kompaniya_id IS NOT NULL THEN
+        UPDATE risk_company_exposure SET
+            open_count = open_count - v_row.open_count,
+            total_count = total_count - v_row.total_count,
+            exposure = exposure - v_row.exposure
+        WHERE kompaniya_id = v_old_kompaniya_id;
+        DELETE FROM risk_company_exposure WHERE kompaniya_id = v_old_kompaniya_id AND total_count = 0;
+    END IF;
+    IF NEW.kompaniya_id IS NOT NULL THEN
+        INSERT INTO risk_company_exposure AS e (kompaniya_id, open_count, total_count, exposure)
+        VALUES (NEW.kompaniya_id, v_row.open_count, v_row.total_count, v_row.exposure)
+        ON CONFLICT (kompaniya_id) DO UPDATE SET
+            open_count = e.open_count + EXCLUDED.open_count,
+            total_count = e.total_count + EXCLUDED.total_count,
+            exposure = e.exposure + EXCLUDED.exposure;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS riski_risk_exposure ON riski;
+CREATE TRIGGER riski_risk_exposure
+    AFTER INSERT OR UPDATE OR DELETE ON riski
+    FOR EACH ROW
+    EXECUTE FUNCTION risk_exposure_track();
+
+DROP TRIGGER IF EXISTS riski_risk_exposure_truncate ON riski;
+CREATE TRIGGER riski_risk_exposure_truncate
+    AFTER TRUNCATE ON riski
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION risk_exposure_reset();
+
+DROP TRIGGER IF EXISTS komponenty_risk_exposure ON komponenty;
+CREATE TRIGGER komponenty_risk_exposure
+    AFTER UPDATE OF kompaniya_id ON komponenty
+    FOR EACH ROW
+    WHEN (OLD.kompaniya_id IS DISTINCT FROM NEW.kompaniya_id)
+    EXECUTE FUNCTION risk_exposure_move_component();
+
+SELECT risk_exposure_rebuild();
+
+COMMENT ON TABLE risk_matrix IS 'Матрица рисков вероятность × влияние (поддерживается триггерами riski)';
+COMMENT ON TABLE risk_component_exposure IS 'Экспозиция рисков по компонентам (поддерживается триггерами riski)';
+COMMENT ON TABLE risk_company_exposure IS 'Экспозиция рисков по компаниям (поддерживается триггерами riski)';
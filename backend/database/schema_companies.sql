@@ -35,6 +35,16 @@ CREATE INDEX idx_company_registration_date ON company(registration_date);
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
 BEGIN
+    -- Пересчёт только служебных производных столбцов (поисковый вектор, балл риска, ключи
+    -- справочников component) не меняет updated_at: строка не попадает в ленту /api/changes,
+    -- и пакетный пересчёт не требует отключать триггер
+    IF to_jsonb(NEW) - ARRAY['updated_at', 'search_tsv', 'risk_score', 'supplier_id', 'object_type_id',
+                             'included_in_name_id', 'included_in_object_type_id']
+       IS NOT DISTINCT FROM
+       to_jsonb(OLD) - ARRAY['updated_at', 'search_tsv', 'risk_score', 'supplier_id', 'object_type_id',
+                             'included_in_name_id', 'included_in_object_type_id'] THEN
+        RETURN NEW;
+    END IF;
     NEW.updated_at = CURRENT_TIMESTAMP;
     RETURN NEW;
 END;
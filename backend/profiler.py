@@ -0,0 +1,149 @@
+"""
+Профилирование процесса API под реальной нагрузкой
+Сэмплирующий профилировщик: раз в interval секунд снимает стеки всех потоков процесса
+(sys._current_frames) и считает одинаковые стеки. Результат — collapsed stacks
+(«кадр;кадр;кадр число»), вход для flamegraph.pl, speedscope и inferno.
+Дополнительно — разница снимков tracemalloc за то же окно.
+"""
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List
+
+# Кадр на вершине стека из этих модулей — поток ждёт (пул потоков, event loop, блокировки).
+# runners.py — event loop uvloop: ожидание событий идёт в C, над asyncio.run кадров Python нет
+_IDLE_MODULES = ("threading.py", "selectors.py", "queue.py", "runners.py")
+
+# Одновременно выполняется только одно профилирование
+_profile_lock = threading.Lock()
+
+
+class ProfilerBusyError(Exception):
+    """Профилирование уже выполняется"""
+
+
+def _path_prefixes() -> List[str]:
+    prefixes = [os.path.abspath(p) + os.sep for p in sys.path if p]
+    return sorted(set(prefixes), key=len, reverse=True)
+
+
+def _frame_label(code: Any, prefixes: List[str], labels: Dict[Any, str]) -> str:
+    """Имя кадра: путь модуля относительно sys.path и функция (app.py:server_timed.<locals>.wrapper)"""
+    label = labels.get(code)
+    if label is None:
+        filename = code.co_filename
+        for prefix in prefixes:
+            if filename.startswith(prefix):
+                filename = filename[len(prefix):]
+                break
+        label = f"{filename}:{getattr(code, 'co_qualname', code.co_name)}"
+        labels[code] = label
+    return label
+
+
+def sample_stacks(seconds: float, interval: float, include_idle: bool = False) -> Dict[str, Any]:
+    """Стеки всех потоков, кроме текущего, каждые interval секунд в течение seconds секунд.
+
+    Время — настенное: поток, ожидающий ответа PostgreSQL внутри psycopg2, тоже попадает
+    в выборку. Ожидающие потоки (пул без работы, event loop в select) без include_idle пропускаются.
+    """
+    own_thread = threading.get_ident()
+    prefixes = _path_prefixes()
+    labels: Dict[Any, str] = {}
+    stacks: Counter = Counter()
+    samples = idle = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+            samples += 1
+            if not include_idle and os.path.basename(frame.f_code.co_filename) in _IDLE_MODULES:
+                idle += 1
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code, prefixes, labels))
+                frame = frame.f_back
+            stacks[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return {"stacks": stacks, "samples": samples, "idle_samples": idle}
+
+
+def collapsed(stacks: Counter) -> str:
+    """Стеки в формате collapsed (самые частые сверху)"""
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+
+
+def _allocation_stats(before: Any, after: Any, top: int) -> List[Dict[str, Any]]:
+    exclude = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ]
+    diff = after.filter_traces(exclude).compare_to(before.filter_traces(exclude), "lineno")
+    result = []
+    for stat in diff[:top]:
+        frame = stat.traceback[0]
+        result.append({
+            "file": frame.filename,
+            "line": frame.lineno,
+            "size_diff_kb": round(stat.size_diff / 1024, 1),
+            "size_kb": round(stat.size / 1024, 1),
+            "count_diff": stat.count_diff,
+        })
+    return result
+
+
+def profile(
+    seconds: float,
+    interval: float,
+    include_idle: bool = False,
+    trace_allocations: bool = False,
+    top: int = 25,
+) -> Dict[str, Any]:
+    """Профиль процесса за seconds секунд: collapsed stacks и (trace_allocations) рост памяти по строкам.
+
+    tracemalloc замедляет выделение памяти, поэтому включается только на время окна
+    (если он не был включён заранее, например PYTHONTRACEMALLOC).
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusyError("Profiling is already in progress")
+    try:
+        started_tracing = False
+        before = None
+        if trace_allocations:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+        started = time.perf_counter()
+        try:
+            sampled = sample_stacks(seconds, interval, include_idle)
+            after = tracemalloc.take_snapshot() if trace_allocations else None
+            traced_current, traced_peak = tracemalloc.get_traced_memory() if trace_allocations else (0, 0)
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+        result: Dict[str, Any] = {
+            "pid": os.getpid(),
+            "seconds": round(time.perf_counter() - started, 3),
+            "interval_ms": round(interval * 1000, 3),
+            "samples": sampled["samples"],
+            "idle_samples": sampled["idle_samples"],
+            "stacks": len(sampled["stacks"]),
+            "collapsed": collapsed(sampled["stacks"]),
+        }
+        if trace_allocations:
+            result["allocations"] = {
+                "traced_current_kb": round(traced_current / 1024, 1),
+                "traced_peak_kb": round(traced_peak / 1024, 1),
+                "top": _allocation_stats(before, after, top),
+            }
+        return result
+    finally:
+        _profile_lock.release()
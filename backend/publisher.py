@@ -0,0 +1,159 @@
+"""
+Публикация статических JSON-снимков для дашбордов, которые раздаёт Apache
+При каждой смене версии данных нефильтрованные ответы API записываются в
+<docroot>/api-static/<версия>/ (плюс сжатые .json.gz), после чего атомарно
+заменяется <docroot>/api-static/manifest.json. Фронтенд читает manifest.json и
+берёт данные из статических файлов, к API обращается только с фильтрами.
+
+Использование:
+    python publisher.py --docroot /home/user/public_html/400           # следить за версией данных
+    python publisher.py --docroot /home/user/public_html/400 --once    # опубликовать один раз
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+import app as api
+
+# Имя файла → функция, возвращающая нефильтрованный ответ API (словарь, а не HTTP-ответ:
+# обработчики с Server-Timing возвращают JSONResponse)
+PUBLISHED_PAYLOADS: Dict[str, Callable[[], Dict[str, Any]]] = {
+    "dashboard-data": lambda: api.dashboard_data_payload(),
+    "components-metrics": lambda: api.components_metrics_payload(),
+    "components-included-in-list": lambda: api.get_included_in_list(),
+    "components-suppliers-list": lambda: api.get_suppliers_list(),
+    "components-companies-list": lambda: api.get_companies_list(),
+}
+
+STATIC_DIR_NAME = "api-static"
+MANIFEST_NAME = "manifest.json"
+
+
+def is_degraded(payload: Dict[str, Any]) -> bool:
+    """Ответ получен не из БД (fallback или устаревший снимок) — такое не публикуем"""
+    meta = payload.get("meta") if isinstance(payload.get("meta"), dict) else payload
+    return bool(meta.get("degraded"))
+
+
+def current_data_version() -> Optional[str]:
+    with api.db_connection() as conn:
+        return api.get_data_version(conn)
+
+
+def read_manifest(static_root: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(static_root, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def publish(docroot: str, data_version: Optional[str], keep: int = 3) -> Optional[Dict[str, Any]]:
+    """Опубликовать все снимки в новый каталог версии; None, если эта версия уже опубликована"""
+    static_root = os.path.join(docroot, STATIC_DIR_NAME)
+    os.makedirs(static_root, exist_ok=True)
+
+    bodies: Dict[str, bytes] = {}
+    for name, produce in PUBLISHED_PAYLOADS.items():
+        payload = produce()
+        if is_degraded(payload):
+            raise RuntimeError(f"{name}: database unavailable, nothing published")
+        bodies[name] = json.dumps(jsonable_encoder(payload), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    # Без миграции data_version версия определяется по содержимому
+    digest = hashlib.sha1()
+    digest.update((data_version or "").encode("utf-8"))
+    if data_version is None:
+        for name in sorted(bodies):
+            digest.update(bodies[name])
+    version = digest.hexdigest()[:16]
+
+    if read_manifest(static_root).get("version") == version:
+        return None
+
+    # Каталог версии собирается во временном каталоге и переименовывается целиком
+    version_dir = os.path.join(static_root, version)
+    tmp_dir = os.path.join(static_root, f".tmp-{version}-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    files: Dict[str, str] = {}
+    for name, body in bodies.items():
+        with open(os.path.join(tmp_dir, f"{name}.json"), "wb") as f:
+            f.write(body)
+        with open(os.path.join(tmp_dir, f"{name}.json.gz"), "wb") as f:
+            f.write(gzip.compress(body, compresslevel=9, mtime=0))
+        files[name] = f"{version}/{name}.json"
+    if os.path.isdir(version_dir):
+        shutil.rmtree(tmp_dir)
+    else:
+        os.rename(tmp_dir, version_dir)
+
+    manifest = {
+        "version": version,
+        "data_version": data_version,
+        "published_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"),
+        "files": files,
+    }
+    write_atomic(os.path.join(static_root, MANIFEST_NAME), json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"))
+    cleanup(static_root, current=version, keep=keep)
+    return manifest
+
+
+def cleanup(static_root: str, current: str, keep: int) -> None:
+    """Удалить старые каталоги версий (текущая и `keep` последних остаются)"""
+    versions = [
+        e for e in os.scandir(static_root)
+        if e.is_dir() and not e.name.startswith(".") and e.name != current
+    ]
+    versions.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+    # Предыдущие версии оставляем: их может дочитывать браузер со старым manifest.json
+    for entry in versions[max(0, keep - 1):]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Публикация статических JSON-снимков дашбордов")
+    parser.add_argument("--docroot", default=os.getenv("PUBLISH_DOCROOT"), help="Каталог дашборда на веб-сервере (где лежит index.html)")
+    parser.add_argument("--interval", type=float, default=float(os.getenv("PUBLISH_INTERVAL", "30")), help="Период проверки версии данных, с")
+    parser.add_argument("--keep", type=int, default=int(os.getenv("PUBLISH_KEEP_VERSIONS", "3")), help="Сколько версий хранить")
+    parser.add_argument("--once", action="store_true", help="Опубликовать один раз и выйти")
+    args = parser.parse_args()
+    if not args.docroot:
+        parser.error("--docroot (или PUBLISH_DOCROOT) обязателен")
+
+    api.snapshots.load()
+    last_version: Optional[str] = None
+    while True:
+        try:
+            data_version = current_data_version()
+            if data_version is None or data_version != last_version:
+                manifest = publish(args.docroot, data_version, keep=args.keep)
+                if manifest is not None:
+                    print(f"Published {manifest['version']} (data_version={data_version})")
+                last_version = data_version
+        except Exception as e:
+            print(f"Publisher error: {e}")
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Реестр именованных SQL-запросов API
+Каждый запрос регистрируется один раз под именем, на каждом подключении из пула
+подготавливается (PREPARE) при первом использовании и дальше выполняется по имени
+(EXECUTE) — PostgreSQL не разбирает и не планирует его текст заново.
+"""
+import hashlib
+import re
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import psycopg2.extensions
+
+# %s → $n, %% → %  (синтаксис параметров psycopg2 → синтаксис PREPARE и DuckDB)
+_PLACEHOLDER_RE = re.compile(r"%%|%s")
+
+
+class PreparedConnection(psycopg2.extensions.connection):
+    """Подключение, помнящее подготовленные на нём запросы (имя → текст)"""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements: Dict[str, str] = {}
+
+
+def to_numbered_params(sql: str) -> Tuple[str, int]:
+    """Текст запроса с параметрами $1..$n вместо %s и число параметров"""
+    count = 0
+
+    def replace(match: "re.Match[str]") -> str:
+        nonlocal count
+        if match.group(0) == "%%":
+            return "%"
+        count += 1
+        return f"${count}"
+
+    return _PLACEHOLDER_RE.sub(replace, sql), count
+
+
+class QueryRegistry:
+    """Именованные параметризованные запросы со статистикой выполнения.
+
+    Текст запроса может содержать фрагменты {name} (условия WHERE, выражения
+    измерений) — они подставляются при выполнении, и каждый вариант текста
+    подготавливается отдельно. Параметры — как в psycopg2 (%s).
+    """
+
+    def __init__(self, enabled: bool = True, max_prepared_per_connection: int = 200):
+        self.enabled = enabled
+        self.max_prepared_per_connection = max_prepared_per_connection
+        self._queries: Dict[str, str] = {}
+        self._unprepared: set = set()
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def register(self, name: str, sql: str, prepare: bool = True) -> str:
+        """Зарегистрировать запрос; имя — идентификатор SQL (буквы, цифры, _).
+
+        prepare=False — выполнять всегда текстом: для запросов, чей лучший план зависит от
+        значений параметров (общий план подготовленного запроса их не видит).
+        """
+        if not re.fullmatch(r"[a-z][a-z0-9_]*", name):
+            raise ValueError(f"Invalid query name: {name}")
+        if name in self._queries:
+            raise ValueError(f"Query already registered: {name}")
+        self._queries[name] = sql
+        if not prepare:
+            self._unprepared.add(name)
+        self._stats[name] = {"calls": 0, "prepares": 0, "errors": 0, "rows": 0, "total_ms": 0.0, "max_ms": 0.0}
+        return name
+
+    def sql(self, name: str, **fragments: str) -> str:
+        """Текст запроса с подставленными фрагментами"""
+        sql = self._queries[name]
+        return sql.format(**fragments) if fragments else sql
+
+    def execute(self, cursor, name: str, params: Sequence[Any] = (), **fragments: str) -> None:
+        """Выполнить запрос по имени (через PREPARE/EXECUTE, если включено)"""
+        sql = self.sql(name, **fragments)
+        conn = cursor.connection
+        prepared = getattr(conn, "prepared_statements", None)
+        started = time.perf_counter()
+        prepared_now = False
+        try:
+            if not self.enabled or prepared is None or name in self._unprepared:
+                cursor.execute(sql, params or None)
+            else:
+                statement = name if not fragments else f"{name}_{hashlib.sha1(sql.encode('utf-8')).hexdigest()[:12]}"
+                prepare_sql, param_count = to_numbered_params(sql)
+                if prepared.get(statement) != prepare_sql:
+                    if len(prepared) >= self.max_prepared_per_connection:
+                        cursor.execute("DEALLOCATE ALL")
+                        prepared.clear()
+                    elif statement in prepared:
+                        cursor.execute(f"DEALLOCATE {statement}")
+                        del prepared[statement]
+                    cursor.execute(f"PREPARE {statement} AS {prepare_sql}")
+                    prepared[statement] = prepare_sql
+                    prepared_now = True
+                if param_count:
+                    cursor.execute(f"EXECUTE {statement} ({', '.join(['%s'] * param_count)})", params)
+                else:
+                    cursor.execute(f"EXECUTE {statement}")
+        except Exception:
+            self._record(name, started, rows=0, prepared_now=prepared_now, error=True)
+            raise
+        self._record(name, started, rows=max(cursor.rowcount, 0), prepared_now=prepared_now, error=False)
+
+    # --- статистика ----------------------------------------------------------
+
+    def _record(self, name: str, started: float, rows: int, prepared_now: bool, error: bool) -> None:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            stats = self._stats[name]
+            stats["calls"] += 1
+            stats["rows"] += rows
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            if prepared_now:
+                stats["prepares"] += 1
+            if error:
+                stats["errors"] += 1
+
+    def reset_stats(self) -> None:
+        with self._stats_lock:
+            for stats in self._stats.values():
+                stats.update({"calls": 0, "prepares": 0, "errors": 0, "rows": 0, "total_ms": 0.0, "max_ms": 0.0})
+
+    def stats(self, name: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Статистика по запросам текущего процесса: calls, prepares, errors, rows, total/mean/max, мс"""
+        with self._stats_lock:
+            items = [(name, self._stats[name])] if name else list(self._stats.items())
+            return {
+                query: {
+                    "calls": int(s["calls"]),
+                    "prepares": int(s["prepares"]),
+                    "errors": int(s["errors"]),
+                    "rows": int(s["rows"]),
+                    "total_ms": round(s["total_ms"], 3),
+                    "mean_ms": round(s["total_ms"] / s["calls"], 3) if s["calls"] else 0.0,
+                    "max_ms": round(s["max_ms"], 3),
+                }
+                for query, s in items
+            }
@@ -0,0 +1,103 @@
+"""
+Пересчёт сводного балла риска компаний (database/migration_company_risk_score.sql)
+Баллы новых и изменённых строк считает триггер; пересчёт всех компаний нужен после изменения
+формулы company_risk_score и после загрузки с отключённым триггером. Таблица проходится
+пакетами по id: каждый пакет — один UPDATE по диапазону id в своей транзакции (балл считается
+одним выражением для всех строк пакета, блокировки держатся недолго). Переписываются только
+строки, у которых балл изменился; updated_at не меняется (триггер update_updated_at_column
+пропускает изменения служебных столбцов), поэтому строки не попадают в /api/changes.
+После пересчёта обновляется статистика company (ANALYZE).
+
+Использование:
+    python risk_score.py                     # пересчитать баллы всех компаний
+    python risk_score.py --batch-size 50000  # пакетами по 50 000 строк
+    python risk_score.py --check             # только посчитать строки с устаревшим баллом
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Dict
+
+from psycopg2.extras import RealDictCursor
+
+import app as api
+
+RISK_SCORE_BATCH_SIZE = int(os.getenv("RISK_SCORE_BATCH_SIZE", "10000"))
+
+# Последний id пакета из batch_size строк после last_id (NULL — строк не осталось)
+api.queries.register("risk_score_batch_end", """
+    SELECT MAX(id) AS last_id FROM (SELECT id FROM company WHERE id > %s ORDER BY id LIMIT %s) s
+""")
+api.queries.register("risk_score_recompute", """
+    UPDATE company SET risk_score = company_risk_score(ido, ifr, ipd, spark_risk)
+    WHERE id > %s AND id <= %s
+      AND risk_score IS DISTINCT FROM company_risk_score(ido, ifr, ipd, spark_risk)
+""")
+api.queries.register("risk_score_stale", """
+    SELECT COUNT(*) AS stale FROM company
+    WHERE risk_score IS DISTINCT FROM company_risk_score(ido, ifr, ipd, spark_risk)
+""")
+
+
+def recompute(batch_size: int = RISK_SCORE_BATCH_SIZE) -> Dict[str, int]:
+    """Пересчитать баллы всех компаний; возвращает число пакетов и изменённых строк"""
+    batches = updated = 0
+    last_id = 0
+    with api.db_connection() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        try:
+            while True:
+                api.queries.execute(cursor, "risk_score_batch_end", (last_id, batch_size))
+                batch_end = cursor.fetchone()["last_id"]
+                if batch_end is None:
+                    break
+                api.queries.execute(cursor, "risk_score_recompute", (last_id, batch_end))
+                updated += cursor.rowcount
+                conn.commit()
+                batches += 1
+                last_id = batch_end
+            # Планировщик выбирает индекс рейтинга по статистике распределения баллов
+            if updated:
+                cursor.execute("ANALYZE company")
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    return {"batches": batches, "updated": updated}
+
+
+def stale_count() -> int:
+    """Число компаний, у которых сохранённый балл не совпадает с формулой"""
+    with api.db_connection() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        api.queries.execute(cursor, "risk_score_stale")
+        stale = int(cursor.fetchone()["stale"])
+        cursor.close()
+        conn.rollback()
+    return stale
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Пересчёт сводного балла риска компаний")
+    parser.add_argument("--batch-size", type=int, default=RISK_SCORE_BATCH_SIZE, help="Строк в одном пакете")
+    parser.add_argument("--check", action="store_true", help="Только посчитать строки с устаревшим баллом")
+    args = parser.parse_args()
+    if args.batch_size < 1:
+        parser.error("--batch-size должен быть больше 0")
+
+    if args.check:
+        stale = stale_count()
+        print(f"{stale} companies with stale risk_score")
+        sys.exit(0 if stale == 0 else 1)
+
+    started = time.perf_counter()
+    result = recompute(args.batch_size)
+    print(f"Recomputed risk_score in {result['batches']} batches: {result['updated']} rows updated "
+          f"in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
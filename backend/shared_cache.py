@@ -0,0 +1,213 @@
+"""
+Кэш ответов API, общий для всех процессов uvicorn
+Записи лежат файлами в общей памяти (/dev/shm) и читаются через mmap, пересчёт одной
+записи выполняет только один процесс (блокировка fcntl), статистика ведётся по процессам.
+"""
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+
+def default_cache_dir() -> str:
+    """Каталог кэша: tmpfs /dev/shm, если он есть, иначе временный каталог"""
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "vsm400-cache")
+
+
+class SharedCache:
+    """Кэш ответов, разделяемый между процессами через файлы в общей памяти.
+
+    Запись — файл <sha1(key)>.json: первая строка — заголовок с версией данных,
+    дальше тело ответа в JSON. Запись атомарна (временный файл + os.replace),
+    чтение — через mmap без блокировок.
+    """
+
+    def __init__(self, directory: str, max_entries: int = 1000, lock_timeout: float = 15.0):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.lock_timeout = lock_timeout
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "computes": 0, "waited_hits": 0, "lock_timeouts": 0, "errors": 0}
+        self._stats_flushed_at = 0.0
+        os.makedirs(os.path.join(self.directory, "stats"), exist_ok=True)
+
+    # --- файлы ---------------------------------------------------------------
+
+    def _path(self, key: str, suffix: str) -> str:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest + suffix)
+
+    def _read(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(key, ".json"), "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    newline = mm.find(b"\n")
+                    header = json.loads(mm[:newline])
+                    if header.get("key") != key:
+                        return None
+                    return {"header": header, "payload": json.loads(mm[newline + 1:])}
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write(self, key: str, payload: Dict[str, Any], data_version: Optional[str]) -> Dict[str, Any]:
+        encoded = jsonable_encoder(payload)
+        header = {"key": key, "data_version": data_version, "created_at": time.time(), "pid": os.getpid()}
+        body = (json.dumps(header, ensure_ascii=False) + "\n" + json.dumps(encoded, ensure_ascii=False)).encode("utf-8")
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, self._path(key, ".json"))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self._evict()
+        return encoded
+
+    def _evict(self) -> None:
+        entries = [e for e in os.scandir(self.directory) if e.name.endswith(".json")]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            for path in (entry.path, entry.path[:-len(".json")] + ".lock"):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+    def _lock(self, key: str) -> Optional[int]:
+        """Эксклюзивная блокировка пересчёта ключа; None, если не дождались"""
+        fd = os.open(self._path(key, ".lock"), os.O_CREAT | os.O_RDWR, 0o644)
+        deadline = time.monotonic() + self.lock_timeout
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    os.close(fd)
+                    return None
+                time.sleep(0.02)
+
+    @staticmethod
+    def _unlock(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    # --- API -----------------------------------------------------------------
+
+    def get(self, key: str, data_version: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Ответ из кэша, если он посчитан для той же версии данных"""
+        entry = self._read(key)
+        if entry is None or entry["header"].get("data_version") != data_version:
+            return None
+        return entry["payload"]
+
+    def seed(self, key: str, payload: Dict[str, Any], data_version: Optional[str]) -> bool:
+        """Положить готовый ответ (например, снимок с диска), если записи ещё нет"""
+        if data_version is None or self._read(key) is not None:
+            return False
+        self._write(key, payload, data_version)
+        return True
+
+    def get_or_compute(self, key: str, data_version: Optional[str], compute: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """Ответ из кэша или пересчёт; одновременно ключ пересчитывает только один процесс"""
+        if data_version is None:
+            # Без версии данных кэш нельзя проверить на актуальность
+            return compute()
+
+        cached = self.get(key, data_version)
+        if cached is not None:
+            self._count("hits")
+            return cached
+        self._count("misses")
+
+        fd = self._lock(key)
+        if fd is None:
+            self._count("lock_timeouts")
+            return compute()
+        try:
+            # Пока ждали блокировку, ответ мог посчитать другой процесс
+            cached = self.get(key, data_version)
+            if cached is not None:
+                self._count("waited_hits")
+                return cached
+            payload = compute()
+            self._count("computes")
+            try:
+                self._write(key, payload, data_version)
+            except OSError:
+                self._count("errors")
+            return payload
+        finally:
+            self._unlock(fd)
+
+    # --- статистика ----------------------------------------------------------
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self._stats[name] += 1
+            now = time.monotonic()
+            if now - self._stats_flushed_at < 1.0:
+                return
+            self._stats_flushed_at = now
+            snapshot = dict(self._stats)
+        self._flush_stats(snapshot)
+
+    def _flush_stats(self, stats: Dict[str, int]) -> None:
+        path = os.path.join(self.directory, "stats", f"{os.getpid()}.json")
+        try:
+            with open(path + ".tmp", "w") as f:
+                json.dump(stats, f)
+            os.replace(path + ".tmp", path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _hit_rate(stats: Dict[str, int]) -> float:
+        lookups = stats["hits"] + stats["misses"]
+        return round((stats["hits"] + stats["waited_hits"]) / lookups, 4) if lookups else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика текущего процесса и всех живых процессов-воркеров"""
+        with self._stats_lock:
+            own = dict(self._stats)
+        self._flush_stats(own)
+        workers: Dict[str, Dict[str, Any]] = {}
+        stats_dir = os.path.join(self.directory, "stats")
+        for entry in os.scandir(stats_dir):
+            if not entry.name.endswith(".json"):
+                continue
+            pid = entry.name[:-len(".json")]
+            try:
+                os.kill(int(pid), 0)
+            except (ValueError, ProcessLookupError):
+                os.unlink(entry.path)
+                continue
+            except PermissionError:
+                pass
+            try:
+                with open(entry.path) as f:
+                    worker = json.load(f)
+            except (OSError, ValueError):
+                continue
+            worker["hit_rate"] = self._hit_rate(worker)
+            workers[pid] = worker
+        own["hit_rate"] = self._hit_rate(own)
+        return {
+            "directory": self.directory,
+            "entries": sum(1 for e in os.scandir(self.directory) if e.name.endswith(".json")),
+            "pid": os.getpid(),
+            "worker": own,
+            "workers": workers,
+        }
@@ -0,0 +1,93 @@
+"""
+Локальное хранилище снимков (snapshot) ответов API
+Последний удачный ответ каждого эндпоинта хранится в SQLite вместе с версией данных,
+из которой он посчитан, и загружается в память при старте приложения.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+
+class SnapshotStore:
+    """Снимки ответов: копия в памяти + запись в SQLite (переживает перезапуск)"""
+
+    def __init__(self, path: str, max_entries: int = 500):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._snapshots: Dict[str, Dict[str, Any]] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        self.loaded = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    key TEXT PRIMARY KEY,
+                    data_version TEXT,
+                    saved_at REAL NOT NULL,
+                    payload TEXT NOT NULL
+                )
+            """)
+            self._db = db
+        return self._db
+
+    def load(self) -> int:
+        """Загрузить все снимки с диска в память; возвращает их число"""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT key, data_version, saved_at, payload FROM snapshots ORDER BY saved_at DESC LIMIT ?",
+                (self.max_entries,),
+            ).fetchall()
+            for key, data_version, saved_at, payload in rows:
+                self._snapshots[key] = {
+                    "payload": json.loads(payload),
+                    "data_version": data_version,
+                    "saved_at": saved_at,
+                }
+            self.loaded = True
+            return len(rows)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Снимок по ключу: {"payload", "data_version", "saved_at"} или None"""
+        with self._lock:
+            return self._snapshots.get(key)
+
+    def items(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Все снимки: [(key, {"payload", "data_version", "saved_at"}), ...]"""
+        with self._lock:
+            return list(self._snapshots.items())
+
+    def put(self, key: str, payload: Dict[str, Any], data_version: Optional[str]) -> None:
+        """Сохранить ответ как последний удачный снимок"""
+        encoded = jsonable_encoder(payload)
+        serialized = json.dumps(encoded, ensure_ascii=False)
+        saved_at = time.time()
+        with self._lock:
+            self._snapshots[key] = {"payload": encoded, "data_version": data_version, "saved_at": saved_at}
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO snapshots (key, data_version, saved_at, payload) VALUES (?, ?, ?, ?)",
+                (key, data_version, saved_at, serialized),
+            )
+            if len(self._snapshots) > self.max_entries:
+                # Вытесняем самые старые снимки
+                oldest = sorted(self._snapshots, key=lambda k: self._snapshots[k]["saved_at"])
+                for stale_key in oldest[:len(self._snapshots) - self.max_entries]:
+                    del self._snapshots[stale_key]
+                    db.execute("DELETE FROM snapshots WHERE key = ?", (stale_key,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._snapshots)
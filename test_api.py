@@ -17,11 +17,22 @@ def test_api():
         if response.status_code == 200:
             data = response.json()
             print(f"   Статус: {data.get('status')}")
-            print(f"   Количество компаний: {data.get('companies_count')}")
         else:
             print(f"   Ошибка: {response.text}")
     except Exception as e:
         print(f"❌ Health check failed: {e}")
+
+    # 1a. Проверка stats endpoint
+    try:
+        response = requests.get(f"{base_url}/api/stats")
+        print(f"✅ Stats: {response.status_code}")
+        if response.status_code == 200:
+            data = response.json()
+            print(f"   Количество компаний (оценка): {data.get('companies_count')}")
+        else:
+            print(f"   Ошибка: {response.text}")
+    except Exception as e:
+        print(f"❌ Stats failed: {e}")
     
     # 2. Проверка companies endpoint
     try:
@@ -38,6 +49,22 @@ def test_api():
     except Exception as e:
         print(f"❌ Companies endpoint failed: {e}")
     
+    # 2a. Проверка batch-запроса компаний
+    try:
+        response = requests.get(f"{base_url}/api/companies/batch", params={"ids": "1,2,3", "include": "components_summary"})
+        print(f"✅ Companies batch: {response.status_code}")
+        if response.status_code == 200:
+            data = response.json()
+            for company in data.get('companies', []):
+                summary = company.get('components_summary', {})
+                print(f"   {company.get('short_name')}: компонентов {summary.get('total_components')}")
+            if data.get('missing'):
+                print(f"   Не найдены: {data.get('missing')}")
+        else:
+            print(f"   Ошибка: {response.text}")
+    except Exception as e:
+        print(f"❌ Companies batch failed: {e}")
+
     # 3. Проверка dashboard-data endpoint
     try:
         response = requests.get(f"{base_url}/api/dashboard-data")
@@ -52,5 +79,31 @@ def test_api():
     except Exception as e:
         print(f"❌ Dashboard data failed: {e}")
 
+    # 4. Проверка timeline endpoint
+    try:
+        response = requests.get(f"{base_url}/api/components/timeline", params={"granularity": "month"})
+        print(f"✅ Components timeline: {response.status_code}")
+        if response.status_code == 200:
+            data = response.json()
+            meta = data.get('meta', {})
+            print(f"   Периодов: {len(data.get('items', []))} ({meta.get('from')} — {meta.get('to')}, источник: {meta.get('source')})")
+        else:
+            print(f"   Ошибка: {response.text}")
+    except Exception as e:
+        print(f"❌ Components timeline failed: {e}")
+
+    # 5. Проверка матрицы рисков
+    try:
+        response = requests.get(f"{base_url}/api/risks/matrix")
+        print(f"✅ Risks matrix: {response.status_code}")
+        if response.status_code == 200:
+            data = response.json()
+            totals = data.get('totals', {})
+            print(f"   Открытых рисков: {totals.get('open_count')}, экспозиция: {totals.get('exposure')} (источник: {data.get('meta', {}).get('source')})")
+        else:
+            print(f"   Ошибка: {response.text}")
+    except Exception as e:
+        print(f"❌ Risks matrix failed: {e}")
+
 if __name__ == "__main__":
     test_api()